@@ -0,0 +1,188 @@
+"""Datos y servicios locales para los benchmarks (sin acceso a red)."""
+
+import base64
+import hashlib
+import io
+import os
+import random
+import selectors
+import socket
+import subprocess
+import threading
+import time
+import zipfile
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_odoo_repo(base_dir, version="17.0", n_modules=20):
+    """Crea un repositorio git bare con la estructura mínima de Odoo en la rama `version`."""
+    work = os.path.join(base_dir, "odoo-src")
+    os.makedirs(os.path.join(work, "odoo"), exist_ok=True)
+    with open(os.path.join(work, "odoo-bin"), "w") as f:
+        f.write("import odoo\n")
+    with open(os.path.join(work, "odoo", "__init__.py"), "w") as f:
+        f.write("version_info = (17, 0)\n")
+    with open(os.path.join(work, "requirements.txt"), "w") as f:
+        f.write("psycopg2-binary\n")
+    for i in range(n_modules):
+        module = os.path.join(work, "addons", f"module_{i}")
+        os.makedirs(module, exist_ok=True)
+        with open(os.path.join(module, "__init__.py"), "w") as f:
+            f.write("\n".join(f"def f{j}(x):\n    return x + {j}\n" for j in range(50)))
+
+    git = ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost"]
+    subprocess.run(git + ["init", "-q", "-b", version, work], check=True)
+    subprocess.run(git + ["-C", work, "add", "-A"], check=True)
+    subprocess.run(git + ["-C", work, "commit", "-q", "-m", "bench"], check=True)
+
+    bare = os.path.join(base_dir, "odoo.git")
+    subprocess.run(["git", "clone", "-q", "--bare", work, bare], check=True)
+    return "file://" + bare
+
+
+def make_wheel(dest_dir, dist_name, module_name, version="1.0"):
+    """Genera un wheel puro mínimo para el índice local."""
+    os.makedirs(dest_dir, exist_ok=True)
+    norm = dist_name.replace("-", "_")
+    dist_info = f"{norm}-{version}.dist-info"
+    files = {
+        f"{module_name}/__init__.py": b"__version__ = '%s'\n" % version.encode(),
+        f"{dist_info}/METADATA": (
+            f"Metadata-Version: 2.1\nName: {dist_name}\nVersion: {version}\n"
+        ).encode(),
+        f"{dist_info}/WHEEL": (
+            b"Wheel-Version: 1.0\nGenerator: loocal-bench\n"
+            b"Root-Is-Purelib: true\nTag: py3-none-any\n"
+        ),
+    }
+    record_lines = []
+    for name, data in files.items():
+        digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=")
+        record_lines.append(f"{name},sha256={digest.decode()},{len(data)}")
+    record_lines.append(f"{dist_info}/RECORD,,")
+    files[f"{dist_info}/RECORD"] = ("\n".join(record_lines) + "\n").encode()
+
+    path = os.path.join(dest_dir, f"{norm}-{version}-py3-none-any.whl")
+    with zipfile.ZipFile(path, "w") as z:
+        for name, data in files.items():
+            z.writestr(name, data)
+    return path
+
+
+def make_postgres_zip(dest_dir, payload_mb=32):
+    """ZIP con la estructura de PostgreSQL portable (pgsql/bin/initdb.exe)."""
+    os.makedirs(dest_dir, exist_ok=True)
+    path = os.path.join(dest_dir, "postgresql-bench.zip")
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as z:
+        z.writestr("pgsql/bin/initdb.exe", b"MZ" + b"\0" * 1024)
+        z.writestr("pgsql/bin/payload.bin", os.urandom(payload_mb * 1024 * 1024))
+        for i in range(200):
+            z.writestr(f"pgsql/share/file_{i}.sql", b"-- sql\n" * 100)
+    return path
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(directory):
+    """Servidor HTTP local en un puerto libre. Devuelve (servidor, url_base)."""
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(QuietHandler, directory=directory)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def occupy_ports(start, count):
+    """
+    Abre `count` sockets en escucha desde `start` (rango 'saturado') y acepta
+    las conexiones en un hilo, como haría un servicio real (si nadie acepta,
+    la cola de escucha se llena y connect() se bloquea).
+    Devuelve una función que libera los puertos.
+    """
+    selector = selectors.DefaultSelector()
+    sockets = []
+    port = start
+    while len(sockets) < count and port < 65535:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            s.bind(("127.0.0.1", port))
+            s.listen(128)
+            s.setblocking(False)
+            selector.register(s, selectors.EVENT_READ)
+            sockets.append(s)
+        except OSError:
+            s.close()
+        port += 1
+
+    stop = threading.Event()
+
+    def accept_loop():
+        while not stop.is_set():
+            for key, _ in selector.select(timeout=0.1):
+                try:
+                    conn, _ = key.fileobj.accept()
+                    conn.close()
+                except OSError:
+                    pass
+
+    thread = threading.Thread(target=accept_loop, daemon=True)
+    thread.start()
+
+    def release():
+        stop.set()
+        thread.join()
+        selector.close()
+        for s in sockets:
+            s.close()
+
+    return release
+
+
+LOGGERS = [
+    "odoo.modules.loading",
+    "odoo.addons.base.models.ir_cron",
+    "odoo.sql_db",
+    "werkzeug",
+    "odoo.addons.mail.models.mail_mail",
+    "odoo.http",
+]
+
+
+def make_odoo_log(path, size_mb, seed=42):
+    """Genera un odoo.log sintético con el formato real de Odoo y algunas trazas."""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    ts = 1_700_000_000
+    written = 0
+    buf = io.StringIO()
+    with open(path, "w") as f:
+        while written < target:
+            ts += rng.random() * 0.5
+            level = rng.choices(
+                ["INFO", "DEBUG", "WARNING", "ERROR", "CRITICAL"],
+                [80, 10, 7, 2.5, 0.5],
+            )[0]
+            stamp = _format_ts(ts)
+            line = (
+                f"{stamp} {rng.randint(1000, 9999)} {level} bench "
+                f"{rng.choice(LOGGERS)}: mensaje de prueba {rng.randint(0, 10**6)}\n"
+            )
+            if level == "ERROR" and rng.random() < 0.3:
+                line += "Traceback (most recent call last):\n" + "  File \"x.py\", line 1\n" * 5
+            buf.write(line)
+            if buf.tell() > 1024 * 1024:
+                chunk = buf.getvalue()
+                f.write(chunk)
+                written += len(chunk)
+                buf = io.StringIO()
+        f.write(buf.getvalue())
+    return path
+
+
+def _format_ts(ts):
+    millis = int((ts % 1) * 1000)
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts)) + f",{millis:03d}"
@@ -0,0 +1,330 @@
+"""
+Benchmarks offline de las rutas críticas del gestor.
+
+Uso:
+    python -m benchmarks.run                      # ejecuta todo y guarda resultados
+    python -m benchmarks.run --only config_save   # solo algunos casos
+    python -m benchmarks.run --save-baseline      # fija los resultados como baseline
+    python -m benchmarks.run --compare            # compara con benchmarks/baseline.json
+
+Nada accede a la red: git clona de un repositorio bare local, pip instala desde
+un directorio de wheels generados al vuelo y las descargas van contra un
+servidor HTTP en 127.0.0.1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+
+from benchmarks import fixtures  # noqa: E402
+from core import telemetry, utils  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+CACHE_DIR = os.path.join(BENCH_DIR, ".cache")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_THRESHOLD = 1.25
+
+CASES = {}
+
+
+def case(name, repeat=5):
+    """Registra un caso. La función recibe (tmp, opts) y devuelve la callable a medir."""
+
+    def decorator(fn):
+        CASES[name] = (fn, repeat)
+        return fn
+
+    return decorator
+
+
+# === 🧪 Casos ===
+@case("ensure_version_cold", repeat=1)
+def bench_ensure_version_cold(tmp, opts):
+    from core import odoo_manager
+
+    repo_url = fixtures.make_odoo_repo(tmp)
+    wheels = os.path.join(tmp, "wheels")
+    fixtures.make_wheel(wheels, "psycopg2-binary", "psycopg2")
+    saved_repo_url = odoo_manager.ODOO_REPO_URL
+    odoo_manager.ODOO_REPO_URL = repo_url
+    opts.cleanups.append(lambda: setattr(odoo_manager, "ODOO_REPO_URL", saved_repo_url))
+    os.environ["PIP_NO_INDEX"] = "1"
+    os.environ["PIP_FIND_LINKS"] = wheels
+    os.environ["PIP_DISABLE_PIP_VERSION_CHECK"] = "1"
+
+    counter = iter(range(1000))
+
+    def run():
+        versions_dir = os.path.join(tmp, f"versions-{next(counter)}")
+        odoo_manager.ensure_version("17.0", versions_dir)
+
+    return run
+
+
+@case("ensure_version_warm", repeat=3)
+def bench_ensure_version_warm(tmp, opts):
+    from core import odoo_manager
+
+    run_cold = bench_ensure_version_cold(tmp, opts)
+    run_cold()
+    versions_dir = os.path.join(tmp, "versions-0")
+    return lambda: odoo_manager.ensure_version("17.0", versions_dir)
+
+
+@case("get_free_port_crowded", repeat=20)
+def bench_get_free_port(tmp, opts):
+    opts.cleanups.append(fixtures.occupy_ports(8069, opts.crowded_ports))
+    return lambda: utils.get_free_port(8069, 8999)
+
+
+def _big_config(n):
+    return {
+        "instances": [
+            {
+                "name": f"inst{i}",
+                "version": "17.0",
+                "path": f"/srv/loocal/instances/inst{i}",
+                "odoo_port": 8069 + i % 900,
+                "db_port": 5433,
+                "status": "stopped",
+            }
+            for i in range(n)
+        ]
+    }
+
+
+@case("config_save_10k", repeat=10)
+def bench_config_save(tmp, opts):
+    utils.CONFIG_PATH = os.path.join(tmp, "config.json")
+    data = _big_config(opts.instances)
+    return lambda: utils.save_config(data)
+
+
+@case("config_load_10k", repeat=10)
+def bench_config_load(tmp, opts):
+    utils.CONFIG_PATH = os.path.join(tmp, "config.json")
+    utils.save_config(_big_config(opts.instances))
+    return utils.load_config
+
+
+@case("download_postgres_zip", repeat=3)
+def bench_download_postgres_zip(tmp, opts):
+    from core.postgres_manager import download_postgres_zip
+
+    served = os.path.join(tmp, "served")
+    fixtures.make_postgres_zip(served, opts.zip_mb)
+    server, base_url = fixtures.serve_directory(served)
+    opts.cleanups.append(server.shutdown)
+    counter = iter(range(1000))
+
+    def run():
+        # Carpeta nueva en cada iteración: se mide descarga + extracción sin caché.
+        dest = os.path.join(tmp, f"pg-{next(counter)}")
+        download_postgres_zip(f"{base_url}/postgresql-bench.zip", dest, "bench")
+
+    return run
+
+
+def _cached_log(size_mb):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"odoo-{size_mb}mb.log")
+    if not os.path.exists(path):
+        print(f"  Generando odoo.log sintético de {size_mb} MB (se cachea)...")
+        fixtures.make_odoo_log(path + ".tmp", size_mb)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+@case("log_index_cold", repeat=3)
+def bench_log_index_cold(tmp, opts):
+    from core import log_index
+
+    path = _cached_log(opts.log_mb)
+    counter = iter(range(1000))
+
+    def run():
+        # Carpeta nueva en cada iteración (enlace al log cacheado): se mide
+        # la indexación completa, sin índice previo.
+        logs_dir = os.path.join(tmp, f"logs-{next(counter)}")
+        os.makedirs(logs_dir)
+        log_path = os.path.join(logs_dir, "odoo.log")
+        try:
+            os.link(path, log_path)
+        except OSError:
+            shutil.copyfile(path, log_path)
+        return log_index.update_index(log_path)
+
+    return run
+
+
+@case("log_index_query", repeat=10)
+def bench_log_index_query(tmp, opts):
+    from core import log_index
+
+    # Copia del log cacheado en una instancia falsa; el índice inicial no se mide.
+    logs_dir = os.path.join(tmp, "inst", "logs")
+    os.makedirs(logs_dir)
+    shutil.copyfile(_cached_log(opts.log_mb), os.path.join(logs_dir, "odoo.log"))
+    instances = [{"name": "bench", "path": os.path.join(tmp, "inst")}]
+    log_index.update_index(os.path.join(logs_dir, "odoo.log"))
+
+    # "ERROR de la última hora", tomando como ahora el último registro del log.
+    last = log_index.query_logs(instances, limit=1, update=False)[0]["ts"]
+    return lambda: log_index.query_logs(instances, level="ERROR", since=last - 3600)
+
+
+@case("gui_refresh_list", repeat=10)
+def bench_gui_refresh_list(tmp, opts):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt6.QtWidgets import QApplication, QListWidget, QWidget
+    except ImportError:
+        raise SkipCase("PyQt6 no está instalado")
+
+    utils.CONFIG_PATH = os.path.join(tmp, "config.json")
+    utils.save_config(_big_config(opts.rows))
+
+    import main
+
+    app = QApplication.instance() or QApplication([])
+    # Solo el widget de lista: evita arrancar PostgreSQL y los servicios del __init__.
+    window = main.OdooManagerApp.__new__(main.OdooManagerApp)
+    QWidget.__init__(window)
+    window.instance_list = QListWidget()
+    opts.cleanups.append(app.processEvents)
+    return lambda: main.OdooManagerApp.refresh_list(window)
+
+
+class SkipCase(Exception):
+    pass
+
+
+# === ⏱️ Ejecución y comparación ===
+def run_case(name, opts):
+    fn, repeat = CASES[name]
+    repeat = opts.repeat or repeat
+    tmp = tempfile.mkdtemp(prefix=f"loocal-bench-{name}-")
+    opts.cleanups = []
+    saved_config_path = utils.CONFIG_PATH
+    saved_env = dict(os.environ)
+    try:
+        target = fn(tmp, opts)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            target()
+            timings.append(time.perf_counter() - started)
+    finally:
+        for cleanup in opts.cleanups:
+            try:
+                cleanup()
+            except Exception:
+                pass
+        utils.CONFIG_PATH = saved_config_path
+        os.environ.clear()
+        os.environ.update(saved_env)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    timings.sort()
+    return {
+        "runs": len(timings),
+        "min": timings[0],
+        "median": statistics.median(timings),
+        "p95": timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+        "max": timings[-1],
+    }
+
+
+def compare(results, baseline, threshold):
+    """Devuelve la lista de casos cuya mediana empeora más de `threshold` veces."""
+    regressions = []
+    print(f"\n{'caso':<26} {'baseline':>10} {'actual':>10} {'ratio':>7}")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "median" not in result:
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else float("inf")
+        flag = "  ⚠️ REGRESIÓN" if ratio > threshold else ""
+        print(f"{name:<26} {base['median']:>9.4f}s {result['median']:>9.4f}s {ratio:>6.2f}x{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks offline de loocal")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="Casos a ejecutar")
+    parser.add_argument("--repeat", type=int, help="Repeticiones por caso (sobrescribe el valor por defecto)")
+    parser.add_argument("--instances", type=int, default=10_000, help="Instancias en config.json")
+    parser.add_argument("--rows", type=int, default=500, help="Filas en refresh_list")
+    parser.add_argument("--crowded-ports", type=int, default=300, help="Puertos ocupados desde 8069")
+    parser.add_argument("--zip-mb", type=int, default=64, help="Tamaño del ZIP de PostgreSQL")
+    parser.add_argument("--log-mb", type=int, default=2048, help="Tamaño del odoo.log sintético")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar como baseline")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, help="Comparar con un baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Ratio de mediana a partir del cual se marca regresión")
+    opts = parser.parse_args(argv)
+
+    # Los spans de los benchmarks no deben mezclarse con el historial real.
+    telemetry.HISTORY_PATH = os.path.join(tempfile.gettempdir(), "loocal-bench-telemetry.jsonl")
+
+    results = {}
+    for name in opts.only or CASES:
+        print(f"▶ {name}")
+        try:
+            results[name] = run_case(name, opts)
+            r = results[name]
+            print(f"  mediana {r['median']:.4f}s · mín {r['min']:.4f}s · p95 {r['p95']:.4f}s ({r['runs']} runs)")
+        except SkipCase as e:
+            results[name] = {"skipped": str(e)}
+            print(f"  omitido: {e}")
+
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "instances": opts.instances,
+            "rows": opts.rows,
+            "crowded_ports": opts.crowded_ports,
+            "zip_mb": opts.zip_mb,
+            "log_mb": opts.log_mb,
+        },
+        "results": results,
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out_path = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados guardados en {out_path}")
+
+    if opts.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline actualizado: {BASELINE_PATH}")
+
+    if opts.compare:
+        with open(opts.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, opts.threshold)
+        if regressions:
+            print(f"\n❌ Regresiones: {', '.join(regressions)}")
+            return 1
+        print("\n✅ Sin regresiones.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
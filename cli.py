@@ -0,0 +1,167 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+from core.log_index import LEVELS, format_records, query_logs
+from core.telemetry import (
+    METRICS_PORT,
+    format_stats,
+    load_spans,
+    start_metrics_server,
+    summarize,
+)
+
+DURATION_RE = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_since(value):
+    """Convierte '30m', '2h', '7d'... en un instante epoch relativo a ahora."""
+    if value is None:
+        return None
+    match = DURATION_RE.match(value.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Duración inválida: {value} (usa 30m, 2h, 7d...)")
+    return time.time() - float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def cmd_stats(args):
+    spans = load_spans(since=args.since, prefix=args.prefix)
+    print(format_stats(summarize(spans)))
+
+
+def cmd_logs(args):
+    instances = None
+    if args.instance:
+        from core.utils import load_config
+
+        instances = [
+            inst for inst in load_config().get("instances", []) if inst["name"] in args.instance
+        ]
+    records = query_logs(
+        instances,
+        level=args.level,
+        since=args.since,
+        logger=args.logger,
+        db=args.db,
+        limit=args.limit,
+    )
+    # Del más antiguo al más nuevo, como en el propio log.
+    print(format_records(records[::-1]))
+
+
+def cmd_profile(args):
+    from core.profiler import (
+        is_profiling,
+        list_profiles,
+        merge_profiles,
+        profile_dir,
+        profiled_processes,
+        set_profiling,
+    )
+    from core.utils import load_config
+
+    instance = next(
+        (inst for inst in load_config().get("instances", []) if inst["name"] == args.instance),
+        None,
+    )
+    if instance is None:
+        sys.exit(f"No existe la instancia '{args.instance}'.")
+
+    if args.action in ("on", "off"):
+        set_profiling(instance, args.action == "on")
+        if not profiled_processes(instance):
+            print("⚠️ La instancia no está en marcha en modo profile.")
+    elif args.action == "merge":
+        print(merge_profiles(instance))
+        return
+
+    state = "activo" if is_profiling(instance) else "en pausa"
+    print(f"Muestreo {state} · {len(profiled_processes(instance))} procesos en modo profile")
+    print(f"Directorio: {profile_dir(instance)}")
+    for path in list_profiles(instance):
+        print(f"  {os.path.basename(path)}")
+
+
+def cmd_trash(args):
+    from core.reaper import discard_database, format_trash, retry_pending
+    from core.utils import load_config
+
+    if args.discard:
+        abandoned = discard_database(args.discard)
+        if not abandoned:
+            sys.exit(f"No hay ninguna base de datos pendiente de '{args.discard}' en la papelera.")
+        for db_name in abandoned:
+            print(f"⚠️ La base de datos '{db_name}' queda en el servidor; elimínala a mano si hace falta.")
+        retry_pending(args.discard)
+    elif args.retry:
+        for name in sorted({entry["name"] for entry in load_config().get("trash", [])}):
+            retry_pending(name)
+
+    print(format_trash(load_config().get("trash", [])))
+
+
+def cmd_metrics(args):
+    start_metrics_server(port=args.port)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Odoo Multi-Version Manager (CLI)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    stats = sub.add_parser("stats", help="Percentiles de tiempos de aprovisionamiento y ciclo de vida")
+    stats.add_argument("--since", type=parse_since, help="Ventana de tiempo (p. ej. 24h, 7d)")
+    stats.add_argument("--prefix", help="Filtrar spans por prefijo (p. ej. ensure_version)")
+    stats.set_defaults(func=cmd_stats)
+
+    logs = sub.add_parser("logs", help="Buscar en los logs de todas las instancias (indexados)")
+    logs.add_argument("--level", type=str.upper, choices=list(LEVELS), help="Nivel mínimo")
+    logs.add_argument("--since", type=parse_since, help="Ventana de tiempo (p. ej. 1h, 2d)")
+    logs.add_argument("--instance", nargs="+", help="Limitar a estas instancias")
+    logs.add_argument("--logger", help="Logger o prefijo (p. ej. odoo.sql_db)")
+    logs.add_argument("--db", help="Base de datos")
+    logs.add_argument("--limit", type=int, default=200, help="Máximo de registros")
+    logs.set_defaults(func=cmd_logs)
+
+    profile = sub.add_parser("profile", help="Controlar el muestreo de una instancia en modo profile")
+    profile.add_argument("instance", help="Nombre de la instancia")
+    profile.add_argument(
+        "action",
+        nargs="?",
+        default="status",
+        choices=["status", "on", "off", "merge"],
+        help="merge: une los ficheros de todos los workers en merged.collapsed",
+    )
+    profile.set_defaults(func=cmd_profile)
+
+    trash = sub.add_parser("trash", help="Borrados de instancias pendientes (papelera)")
+    trash_action = trash.add_mutually_exclusive_group()
+    trash_action.add_argument("--retry", action="store_true", help="Reintentar ahora los borrados pendientes")
+    trash_action.add_argument(
+        "--discard",
+        metavar="INSTANCIA",
+        help="Dejar de intentar eliminar su base de datos y liberar el nombre",
+    )
+    trash.set_defaults(func=cmd_trash)
+
+    metrics = sub.add_parser("metrics", help="Servir métricas en formato Prometheus")
+    metrics.add_argument("--port", type=int, default=METRICS_PORT)
+    metrics.set_defaults(func=cmd_metrics)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
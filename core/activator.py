@@ -0,0 +1,290 @@
+"""
+Activación bajo demanda de instancias (estilo socket activation).
+
+Mientras la instancia está detenida, un listener asyncio mantiene ocupado su
+`odoo_port`. La primera conexión arranca Odoo en un puerto interno, espera a
+que acepte conexiones y a partir de ahí reenvía el tráfico. Tras
+`idle_timeout` segundos sin conexiones abiertas, la instancia se detiene de
+nuevo y solo queda el listener.
+"""
+
+import asyncio
+import time
+
+from .async_loop import run_coroutine, submit_coroutine
+from .utils import get_free_port
+from .odoo_manager import stop_instance
+from .scheduler import get_scheduler
+
+DEFAULT_IDLE_TIMEOUT = 600
+START_TIMEOUT = 180
+BUFFER_SIZE = 64 * 1024
+
+_activators = {}
+
+
+class InstanceActivator:
+    def __init__(self, instance, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.instance = dict(instance)
+        self.idle_timeout = idle_timeout
+        self.backend_port = None
+        self.process = None
+        self.ready = False
+        self.active_connections = 0
+        self.last_activity = time.monotonic()
+        self._server = None
+        self._watchdog = None
+        self._start_lock = asyncio.Lock()
+
+    @property
+    def name(self):
+        return self.instance["name"]
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    async def start(self):
+        port = self.instance.get("odoo_port", 8069)
+        self._server = await asyncio.start_server(self._on_client, "0.0.0.0", port)
+        self._watchdog = asyncio.create_task(self._idle_watchdog())
+        print(f"Activación bajo demanda de '{self.name}' escuchando en el puerto {port}")
+
+    async def close(self):
+        """Deja de escuchar y de vigilar la inactividad, sin detener Odoo."""
+        if self._watchdog:
+            self._watchdog.cancel()
+        if self._server:
+            self._server.close()
+
+    async def stop(self):
+        await self.close()
+        if self._server:
+            await self._server.wait_closed()
+        await self._hibernate(force=True)
+
+    # === 🚀 Arranque y parada de la instancia ===
+    async def _ensure_started(self):
+        if self.running and self.ready:
+            return
+        async with self._start_lock:
+            if self.running and self.ready:
+                return
+
+            loop = asyncio.get_running_loop()
+            if not self.running:
+                self.ready = False
+                self.backend_port = await loop.run_in_executor(
+                    None, get_free_port, 9000, 9999
+                )
+                print(f"Primera petición para '{self.name}', iniciando Odoo...")
+                self.process = await self._launch(loop)
+
+            deadline = time.monotonic() + START_TIMEOUT
+            while time.monotonic() < deadline:
+                if not self.running:
+                    raise RuntimeError(f"Odoo '{self.name}' terminó durante el arranque.")
+                try:
+                    _, writer = await asyncio.open_connection("127.0.0.1", self.backend_port)
+                    writer.close()
+                    self.ready = True
+                    print(f"Instancia '{self.name}' lista en el puerto interno {self.backend_port}")
+                    return
+                except OSError:
+                    await asyncio.sleep(0.25)
+            raise RuntimeError(f"Odoo '{self.name}' no respondió en {START_TIMEOUT}s.")
+
+    async def _launch(self, loop):
+        """
+        Arranca a través del planificador de admisión, que escribe workers,
+        límites de memoria y db_maxconn, y puede retrasar el arranque si no hay
+        recursos.
+        """
+        launched = loop.create_future()
+
+        def on_launch(process, error):
+            def resolve():
+                if launched.done():
+                    return
+                if error is not None:
+                    launched.set_exception(error)
+                else:
+                    launched.set_result(process)
+
+            loop.call_soon_threadsafe(resolve)
+
+        scheduler = get_scheduler()
+        await loop.run_in_executor(
+            None,
+            lambda: scheduler.request_start(
+                self.instance, on_launch=on_launch, http_port=self.backend_port
+            ),
+        )
+        try:
+            return await asyncio.wait_for(launched, START_TIMEOUT)
+        except asyncio.TimeoutError:
+            await loop.run_in_executor(None, scheduler.cancel, self.name)
+            raise RuntimeError(
+                f"Sin recursos para iniciar '{self.name}' en {START_TIMEOUT}s."
+            )
+
+    def _idle(self):
+        return (
+            self.active_connections == 0
+            and time.monotonic() - self.last_activity >= self.idle_timeout
+        )
+
+    async def _hibernate(self, force=False):
+        async with self._start_lock:
+            if self.process is None:
+                return
+            # Puede haber llegado una petición mientras se esperaba el lock.
+            if not force and not self._idle():
+                return
+            print(f"Instancia '{self.name}' inactiva, deteniendo...")
+            # Durante la parada ordenada el proceso sigue vivo pero ya no
+            # acepta conexiones: las peticiones nuevas esperan al lock y
+            # relanzan en vez de conectar a un backend que se está cerrando.
+            self.ready = False
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, stop_instance, self.instance)
+            self.process = None
+
+    async def _idle_watchdog(self):
+        while True:
+            await asyncio.sleep(min(30, max(1, self.idle_timeout / 4)))
+            if self.process is not None and self._idle():
+                await self._hibernate()
+
+    # === 🔀 Proxy TCP ===
+    async def _on_client(self, reader, writer):
+        self.active_connections += 1
+        self.last_activity = time.monotonic()
+        up_writer = None
+        try:
+            try:
+                up_reader, up_writer = await self._connect_backend()
+            except Exception as e:
+                print(f"⚠️ No se pudo activar '{self.name}': {e}")
+                writer.write(
+                    b"HTTP/1.1 503 Service Unavailable\r\n"
+                    b"Content-Length: 0\r\nConnection: close\r\n\r\n"
+                )
+                await writer.drain()
+                return
+
+            await asyncio.gather(
+                self._pipe(reader, up_writer),
+                self._pipe(up_reader, writer),
+            )
+        except ConnectionError:
+            pass
+        finally:
+            self.active_connections -= 1
+            self.last_activity = time.monotonic()
+            if up_writer is not None:
+                up_writer.close()
+            writer.close()
+
+    async def _connect_backend(self, attempts=3):
+        """
+        Conecta con Odoo, arrancándolo si hace falta. Si la conexión falla
+        (parada en curso, proceso caído) se marca como no listo y se vuelve a
+        pasar por `_ensure_started`, que espera a la parada y relanza.
+        """
+        for attempt in range(attempts):
+            await self._ensure_started()
+            try:
+                return await asyncio.open_connection("127.0.0.1", self.backend_port)
+            except OSError:
+                if attempt == attempts - 1:
+                    raise
+                async with self._start_lock:
+                    if self.running and self.ready:
+                        self.ready = False
+
+    async def _pipe(self, reader, writer):
+        try:
+            while True:
+                data = await reader.read(BUFFER_SIZE)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+                self.last_activity = time.monotonic()
+        except ConnectionError:
+            pass
+        finally:
+            if writer.can_write_eof() and not writer.is_closing():
+                try:
+                    writer.write_eof()
+                except OSError:
+                    writer.close()
+
+    def status(self):
+        return {
+            "name": self.name,
+            "running": self.running,
+            "ready": self.ready,
+            "backend_port": self.backend_port,
+            "connections": self.active_connections,
+            "idle_seconds": round(time.monotonic() - self.last_activity, 1),
+        }
+
+
+# === ⚙️ API síncrona para el gestor ===
+def enable_activation(instance, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Empieza a escuchar en el puerto de la instancia y la arranca al primer acceso."""
+    name = instance["name"]
+    if name in _activators:
+        return _activators[name]
+
+    activator = run_coroutine(_create(instance, idle_timeout), timeout=10)
+    _activators[name] = activator
+    return activator
+
+
+async def _create(instance, idle_timeout):
+    activator = InstanceActivator(instance, idle_timeout)
+    await activator.start()
+    return activator
+
+
+def disable_activation(name, timeout=60):
+    """Cierra el listener y detiene la instancia si estaba en marcha."""
+    activator = _activators.pop(name, None)
+    if activator is not None:
+        run_coroutine(activator.stop(), timeout=timeout)
+
+
+def release_activation(name):
+    """
+    Cierra el listener sin esperar ni detener la instancia. Para el borrado:
+    el reaper ya detiene los procesos en segundo plano.
+    """
+    activator = _activators.pop(name, None)
+    if activator is not None:
+        submit_coroutine(activator.close())
+
+
+def is_activation_enabled(name):
+    return name in _activators
+
+
+def activate_now(name):
+    """Fuerza el arranque de una instancia activada sin esperar a una petición."""
+    return submit_coroutine(_activators[name]._ensure_started())
+
+
+def hibernate_now(name, timeout=60):
+    """Detiene la instancia pero mantiene el listener a la espera de peticiones."""
+    run_coroutine(_activators[name]._hibernate(force=True), timeout=timeout)
+
+
+def activation_status():
+    return {name: act.status() for name, act in _activators.items()}
+
+
+def stop_all_activations():
+    for name in list(_activators):
+        disable_activation(name)
@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """
+    Devuelve el bucle asyncio compartido por los servicios del gestor.
+    Se inicia bajo demanda en un hilo daemon para no bloquear el hilo de Qt.
+    """
+    global _loop, _thread
+
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(
+                target=_loop.run_forever, name="loocal-asyncio", daemon=True
+            )
+            _thread.start()
+        return _loop
+
+
+def run_coroutine(coro, timeout=None):
+    """Ejecuta una corrutina en el bucle de fondo y espera su resultado."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    return future.result(timeout)
+
+
+def submit_coroutine(coro):
+    """Programa una corrutina en el bucle de fondo sin esperar su resultado."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
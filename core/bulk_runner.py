@@ -0,0 +1,190 @@
+"""
+Actualización y tests de módulos en lote sobre varias instancias.
+
+Cada instancia se procesa con `odoo-bin -u <módulos> --stop-after-init` (más
+`--test-enable` en modo test) usando el Python de su versión. Los trabajos se
+ejecutan en paralelo hasta un límite por CPU y por conexiones de PostgreSQL;
+la salida de cada uno se guarda en `logs/bulk-<modo>-<fecha>.log` y se
+retransmite línea a línea con el prefijo de la instancia.
+"""
+
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import psutil
+
+from .odoo_manager import find_instance_processes, get_version_dir, get_venv_python
+from .pg_pooler import ensure_pooler
+from .scheduler import MAX_DB_CONNECTIONS, RESERVED_DB_CONNECTIONS
+
+CONNECTIONS_PER_JOB = 4
+ERROR_LINE_RE = re.compile(r"^\S+ \S+ \d+ (ERROR|CRITICAL) ")
+
+
+def default_parallelism():
+    """Límite de trabajos simultáneos según núcleos y conexiones disponibles."""
+    cpu_limit = psutil.cpu_count() or 1
+    db_limit = (MAX_DB_CONNECTIONS - RESERVED_DB_CONNECTIONS) // CONNECTIONS_PER_JOB
+    return max(1, min(cpu_limit, db_limit))
+
+
+def build_command(instance, modules, mode="upgrade"):
+    version_dir = get_version_dir(instance["version"])
+    cmd = [
+        get_venv_python(instance["version"]),
+        os.path.join(version_dir, "odoo-bin"),
+        "-c",
+        os.path.join(instance["path"], "odoo.conf"),
+        "-d",
+        instance["name"],
+        "-u",
+        ",".join(modules),
+        "--stop-after-init",
+        # El planificador puede haber dejado workers > 0 en el odoo.conf: en
+        # modo prefork los tests HttpCase/tour fallan ("use --workers 0").
+        "--workers=0",
+        f"--db_maxconn={CONNECTIONS_PER_JOB}",
+        # logfile vacío: Odoo escribe en la salida estándar y la capturamos.
+        "--logfile=",
+    ]
+    if mode == "test":
+        cmd.append("--test-enable")
+    else:
+        cmd.append("--max-cron-threads=0")
+    return cmd
+
+
+def run_instance_job(instance, modules, mode="upgrade", log_cb=None):
+    """Ejecuta el trabajo de una instancia y devuelve su resultado."""
+    name = instance["name"]
+    result = {
+        "name": name,
+        "mode": mode,
+        "status": "skipped",
+        "returncode": None,
+        "errors": 0,
+        "duration": 0.0,
+        "log": None,
+    }
+
+    if find_instance_processes(instance):
+        result["reason"] = "la instancia está en ejecución"
+        if log_cb:
+            log_cb(f"[{name}] ⏭️ Omitida: la instancia está en ejecución.")
+        return result
+
+    # Una instancia bajo demanda hibernada no tiene procesos, pero su listener
+    # la arrancaría al primer acceso en mitad de la actualización.
+    if instance.get("on_demand"):
+        result["reason"] = "la instancia está en modo bajo demanda"
+        if log_cb:
+            log_cb(f"[{name}] ⏭️ Omitida: la instancia está en modo bajo demanda.")
+        return result
+
+    if instance.get("pooler_port"):
+        # El odoo.conf apunta al pooler: tiene que estar escuchando antes.
+        ensure_pooler(instance["db_port"], port=instance["pooler_port"])
+
+    logs_dir = os.path.join(instance["path"], "logs")
+    os.makedirs(logs_dir, exist_ok=True)
+    log_path = os.path.join(
+        logs_dir, f"bulk-{mode}-{time.strftime('%Y%m%d-%H%M%S')}.log"
+    )
+    result["log"] = log_path
+
+    started = time.monotonic()
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        process = subprocess.Popen(
+            build_command(instance, modules, mode),
+            cwd=get_version_dir(instance["version"]),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+        )
+        for line in process.stdout:
+            log_file.write(line)
+            if ERROR_LINE_RE.match(line):
+                result["errors"] += 1
+            if log_cb:
+                log_cb(f"[{name}] {line.rstrip()}")
+        process.wait()
+
+    result["duration"] = round(time.monotonic() - started, 2)
+    result["returncode"] = process.returncode
+    result["status"] = (
+        "ok" if process.returncode == 0 and result["errors"] == 0 else "failed"
+    )
+    return result
+
+
+def run_bulk_job(modules, instances, mode="upgrade", max_parallel=None, log_cb=None,
+                 done_cb=None):
+    """
+    Lanza el trabajo en todas las instancias y devuelve la lista de resultados
+    en el mismo orden que `instances`. `done_cb(resultado)` se llama al
+    terminar cada instancia.
+    """
+    if mode not in ("upgrade", "test"):
+        raise ValueError(f"Modo desconocido: {mode}")
+    modules = [m.strip() for m in modules if m.strip()]
+    if not modules:
+        raise ValueError("No se indicó ningún módulo.")
+
+    max_parallel = max_parallel or default_parallelism()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        futures = {
+            pool.submit(run_instance_job, inst, modules, mode, log_cb): inst["name"]
+            for inst in instances
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = {"name": name, "mode": mode, "status": "failed",
+                                 "returncode": None, "errors": 1, "duration": 0.0,
+                                 "log": None, "reason": str(e)}
+            if done_cb:
+                done_cb(results[name])
+    return [results[inst["name"]] for inst in instances]
+
+
+def format_summary(results):
+    icons = {"ok": "✅", "failed": "❌", "skipped": "⏭️"}
+    lines = []
+    for r in results:
+        line = f"{icons.get(r['status'], '?')} {r['name']}: {r['status']} en {r['duration']}s"
+        if r.get("errors"):
+            line += f", {r['errors']} errores en el log"
+        if r.get("reason"):
+            line += f" ({r['reason']})"
+        lines.append(line)
+    ok = sum(r["status"] == "ok" for r in results)
+    total_time = sum(r["duration"] for r in results)
+    lines.append(f"Total: {ok}/{len(results)} correctas, {total_time:.1f}s de trabajo acumulado.")
+    return "\n".join(lines)
+
+
+def bulk_job_setup(progress_cb, log_cb, modules, instances, mode="upgrade", max_parallel=None):
+    """Versión con feedback visual para InstallerThread."""
+    total = len(instances)
+    finished = []
+
+    def on_done(result):
+        finished.append(result)
+        progress_cb.emit(
+            int(len(finished) / total * 100),
+            f"{len(finished)}/{total} instancias procesadas",
+        )
+
+    progress_cb.emit(0, f"Procesando {total} instancias...")
+    results = run_bulk_job(modules, instances, mode, max_parallel, log_cb.emit, on_done)
+    log_cb.emit("")
+    log_cb.emit(format_summary(results))
+    if any(r["status"] == "failed" for r in results):
+        raise RuntimeError("Algunas instancias fallaron; revisa el resumen.")
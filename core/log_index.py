@@ -0,0 +1,352 @@
+"""
+Índice incremental de los logs de las instancias.
+
+Cada fichero `instances/<nombre>/logs/odoo.log*` tiene un índice SQLite en
+`logs/.index/<fichero>.sqlite` con una fila por registro de log: instante,
+offset y longitud en bytes, nivel, logger y base de datos. Al actualizar solo
+se lee desde el último offset indexado; si el fichero ha rotado o se ha
+truncado (cambia la cabecera o es más corto) el índice se reconstruye.
+
+Las consultas (`query_logs`) filtran sobre los índices y solo leen del log
+los registros que coinciden, así que buscar "ERROR en la última hora" en
+todas las instancias no vuelve a recorrer gigas de texto.
+"""
+
+import calendar
+import glob
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+from .utils import load_config
+
+INDEX_DIR_NAME = ".index"
+LOG_GLOB = "odoo.log*"
+HEAD_BYTES = 4096
+COMMIT_EVERY = 50_000
+MESSAGE_MAX_BYTES = 64 * 1024
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+LEVELS_BY_NAME = {name.encode(): value for name, value in LEVELS.items()}
+
+# "2024-05-01 10:00:00,123 4242 ERROR mydb odoo.http: mensaje"
+# Odoo escribe los instantes en UTC.
+RECORD_RE = re.compile(
+    rb"^(\d{4}-\d\d-\d\d \d\d:\d\d):(\d\d,\d{3}) \d+ ([A-Z]+) (\S+) ([^\s:]+):"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS entries (
+    ts REAL NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    logger TEXT NOT NULL,
+    db TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_ts ON entries (ts);
+CREATE INDEX IF NOT EXISTS entries_level_ts ON entries (level, ts);
+"""
+
+
+# === 🗂️ Índice por fichero ===
+def index_path_for(log_path):
+    directory, filename = os.path.split(log_path)
+    return os.path.join(directory, INDEX_DIR_NAME, filename + ".sqlite")
+
+
+def _connect(log_path):
+    path = index_path_for(log_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    # El índice se puede reconstruir desde el log: no hace falta fsync.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _get_meta(conn):
+    return dict(conn.execute("SELECT key, value FROM meta"))
+
+
+def _set_meta(conn, **values):
+    conn.executemany(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+        [(k, str(v)) for k, v in values.items()],
+    )
+
+
+def _head_signature(f, length):
+    f.seek(0)
+    return hashlib.sha1(f.read(length)).hexdigest()
+
+
+def update_index(log_path):
+    """
+    Indexa lo añadido al log desde la última vez. Devuelve el número de
+    registros nuevos (o reindexados).
+    """
+    conn = _connect(log_path)
+    try:
+        with open(log_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            meta = _get_meta(conn)
+            offset = int(meta.get("indexed_offset", 0))
+
+            # Rotación o truncado: el fichero es más corto o su cabecera ya no
+            # es la indexada. Mientras no llegue a HEAD_BYTES la cabecera
+            # crece, así que solo se compara el tramo que ya se había visto.
+            head_size = int(meta.get("head_size", 0))
+            if size < offset or _head_signature(f, head_size) != meta.get("head"):
+                if meta.get("head"):
+                    _hand_over_rotated(log_path, conn, meta)
+                conn.execute("DELETE FROM entries")
+                offset = 0
+            elif size == int(meta.get("indexed_end", -1)):
+                return 0
+
+            # El último registro puede seguir creciendo (trazas), así que se
+            # vuelve a indexar desde su inicio.
+            conn.execute(
+                "DELETE FROM entries WHERE rowid = (SELECT MAX(rowid) FROM entries) "
+                "AND offset >= ?",
+                (offset,),
+            )
+            added, end = _scan(conn, f, offset)
+            head_size = min(size, HEAD_BYTES)
+            _set_meta(
+                conn,
+                head=_head_signature(f, head_size),
+                head_size=head_size,
+                indexed_end=end,
+            )
+            conn.commit()
+            return added
+    finally:
+        conn.close()
+
+
+def _hand_over_rotated(log_path, conn, meta):
+    """
+    Si el log indexado se ha renombrado (odoo.log → odoo.log.2024-05-01), copia
+    el índice al nuevo nombre para no tener que recorrerlo otra vez.
+    """
+    directory = os.path.dirname(log_path)
+    for candidate in glob.glob(os.path.join(directory, LOG_GLOB)):
+        if candidate == log_path or os.path.exists(index_path_for(candidate)):
+            continue
+        try:
+            with open(candidate, "rb") as f:
+                if _head_signature(f, int(meta["head_size"])) != meta["head"]:
+                    continue
+        except OSError:
+            continue
+        target = sqlite3.connect(index_path_for(candidate))
+        try:
+            conn.backup(target)
+        finally:
+            target.close()
+        return candidate
+    return None
+
+
+def _scan(conn, f, offset):
+    """Recorre el log desde `offset` e inserta los registros encontrados."""
+    f.seek(offset)
+    minutes = {}
+    names = {}  # bytes → str: loggers y bases de datos se repiten mucho.
+    batch = []
+    added = 0
+    current = None  # [ts, offset, length, level, logger, db]
+    position = offset
+    match_record = RECORD_RE.match
+
+    for line in f:
+        if line[-1:] != b"\n":
+            break  # Línea a medio escribir: se indexará en la próxima pasada.
+        match = match_record(line)
+        if match:
+            if current is not None:
+                batch.append(current)
+                if len(batch) >= COMMIT_EVERY:
+                    added += _flush(conn, batch, position)
+                    batch = []
+            minute, seconds, level, db, logger = match.groups()
+            base = minutes.get(minute)
+            if base is None:
+                base = minutes[minute] = calendar.timegm(
+                    time.strptime(minute.decode(), "%Y-%m-%d %H:%M")
+                )
+            if logger not in names:
+                names[logger] = logger.decode(errors="replace")
+            if db not in names:
+                names[db] = db.decode(errors="replace")
+            current = [
+                base + float(seconds.replace(b",", b".")),
+                position,
+                len(line),
+                LEVELS_BY_NAME.get(level, 0),
+                names[logger],
+                names[db],
+            ]
+        elif current is not None:
+            current[2] += len(line)  # Continuación (traceback, SQL...).
+        position += len(line)
+
+    if current is not None:
+        batch.append(current)
+        added += _flush(conn, batch, current[1])
+    else:
+        _set_meta(conn, indexed_offset=position)
+    return added, position
+
+
+def _flush(conn, batch, indexed_offset):
+    conn.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)", batch)
+    _set_meta(conn, indexed_offset=indexed_offset)
+    conn.commit()
+    return len(batch)
+
+
+# === 🔎 Consultas ===
+def instance_log_files(instance):
+    logs_dir = os.path.join(instance["path"], "logs")
+    return sorted(
+        path
+        for path in glob.glob(os.path.join(logs_dir, LOG_GLOB))
+        if os.path.isfile(path) and not path.endswith(".gz")
+    )
+
+
+def prune_indexes(instance):
+    """Borra los índices de logs que ya no existen (rotaciones antiguas)."""
+    index_dir = os.path.join(instance["path"], "logs", INDEX_DIR_NAME)
+    if not os.path.isdir(index_dir):
+        return
+    for filename in os.listdir(index_dir):
+        source = os.path.join(os.path.dirname(index_dir), filename[: -len(".sqlite")])
+        if filename.endswith(".sqlite") and not os.path.exists(source):
+            os.remove(os.path.join(index_dir, filename))
+
+
+def parse_level(value):
+    if value is None:
+        return None
+    try:
+        return LEVELS[value.upper()]
+    except KeyError:
+        raise ValueError(f"Nivel desconocido: {value} (usa {', '.join(LEVELS)})")
+
+
+def query_logs(
+    instances=None,
+    level=None,
+    since=None,
+    until=None,
+    logger=None,
+    db=None,
+    limit=200,
+    update=True,
+):
+    """
+    Busca registros en los logs de las instancias (todas por defecto).
+
+    `level` es el nivel mínimo ("ERROR" incluye CRITICAL), `since`/`until`
+    son instantes epoch y `logger` filtra por prefijo. Devuelve los `limit`
+    registros más recientes, del más nuevo al más antiguo.
+    """
+    if instances is None:
+        instances = load_config().get("instances", [])
+    min_level = parse_level(level)
+
+    clauses, params = [], []
+    if min_level is not None:
+        clauses.append("level >= ?")
+        params.append(min_level)
+    if since is not None:
+        clauses.append("ts >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("ts < ?")
+        params.append(until)
+    if logger:
+        clauses.append("(logger = ? OR logger LIKE ? ESCAPE '\\')")
+        escaped = logger.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params += [logger, escaped + ".%"]
+    if db:
+        clauses.append("db = ?")
+        params.append(db)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = (
+        f"SELECT ts, offset, length, level, logger, db FROM entries {where} "
+        f"ORDER BY ts DESC LIMIT ?"
+    )
+
+    matches = []
+    for instance in instances:
+        if update:
+            prune_indexes(instance)
+        for log_path in instance_log_files(instance):
+            if update:
+                update_index(log_path)
+            conn = _connect(log_path)
+            try:
+                rows = conn.execute(sql, params + [limit]).fetchall()
+            finally:
+                conn.close()
+            matches += [(row, instance["name"], log_path) for row in rows]
+
+    matches.sort(key=lambda m: m[0][0], reverse=True)
+    return _read_records(matches[:limit])
+
+
+def _read_records(matches):
+    level_names = {v: k for k, v in LEVELS.items()}
+    records = []
+    handles = {}
+    try:
+        for (ts, offset, length, level, logger, db), name, log_path in matches:
+            f = handles.get(log_path)
+            if f is None:
+                f = handles[log_path] = open(log_path, "rb")
+            f.seek(offset)
+            message = f.read(min(length, MESSAGE_MAX_BYTES))
+            records.append(
+                {
+                    "instance": name,
+                    "file": log_path,
+                    "ts": ts,
+                    "level": level_names.get(level, str(level)),
+                    "logger": logger,
+                    "db": db,
+                    "message": message.decode("utf-8", errors="replace").rstrip("\n"),
+                }
+            )
+    finally:
+        for f in handles.values():
+            f.close()
+    return records
+
+
+def format_records(records):
+    if not records:
+        return "No hay registros que coincidan."
+    return "\n".join(f"[{r['instance']}] {r['message']}" for r in records)
+
+
+def log_search_setup(progress_cb, log_cb, instances, level=None, since=None, limit=200):
+    """Versión con feedback visual para InstallerThread."""
+    progress_cb.emit(0, f"Actualizando índices de {len(instances)} instancias...")
+    for i, instance in enumerate(instances, 1):
+        prune_indexes(instance)
+        for log_path in instance_log_files(instance):
+            update_index(log_path)
+        progress_cb.emit(int(i / len(instances) * 90), f"{i}/{len(instances)} instancias indexadas")
+
+    records = query_logs(instances, level=level, since=since, limit=limit, update=False)
+    log_cb.emit(format_records(records))
+    progress_cb.emit(100, f"{len(records)} registros encontrados.")
@@ -2,11 +2,29 @@ import os
 import sys
 import subprocess
 import platform
-import shutil
+import configparser
+import threading
+import time
+import psutil
 
-from .utils import get_free_port, load_config, save_config
+from .utils import config_lock, get_free_port, load_config, save_config, wait_for_port
 from .postgres_manager import BIN_DIR
+from .pg_pooler import ensure_pooler, pooler_port_for
+from .warmup import warmup_version
+from .telemetry import load_spans, record, span, timed
 
+def venv_executable(venv_path, name):
+    """Ruta de un ejecutable del entorno virtual (Scripts\\*.exe en Windows, bin/* en el resto)."""
+    if platform.system() == "Windows":
+        return os.path.join(venv_path, "Scripts", f"{name}.exe")
+    return os.path.join(venv_path, "bin", name)
+
+
+# Se puede apuntar a un espejo o repositorio local (p. ej. en los benchmarks)
+ODOO_REPO_URL = os.environ.get("LOOCAL_ODOO_REPO", "https://github.com/odoo/odoo.git")
+
+
+@timed("ensure_version")
 def ensure_version(version, versions_dir):
     version_path = os.path.join(versions_dir, version)
     venv_path = os.path.join(version_path, "venv")
@@ -16,28 +34,28 @@ def ensure_version(version, versions_dir):
     # === 1️⃣ Descargar Odoo si no existe ===
     if not os.path.exists(version_path):
         print(f"Descargando Odoo {version}...")
-        subprocess.run(
-            [
-                "git",
-                "clone",
-                "--depth",
-                "1",
-                "-b",
-                version,
-                "https://github.com/odoo/odoo.git",
-                version_path,
-            ],
-            check=True,
-        )
+        with span("ensure_version.git_clone", version=version):
+            subprocess.run(
+                [
+                    "git",
+                    "clone",
+                    "--depth",
+                    "1",
+                    "-b",
+                    version,
+                    ODOO_REPO_URL,
+                    version_path,
+                ],
+                check=True,
+            )
 
     # === 2️⃣ Crear entorno virtual si no existe ===
     if not os.path.exists(venv_path):
         print(f"Creando entorno virtual para Odoo {version}...")
-        subprocess.run([sys.executable, "-m", "venv", venv_path], check=True)
+        with span("ensure_version.venv", version=version):
+            subprocess.run([sys.executable, "-m", "venv", venv_path], check=True)
 
-    pip_exec = os.path.join(
-        venv_path, "Scripts", "pip.exe" if platform.system() == "Windows" else "bin/pip"
-    )
+    pip_exec = venv_executable(venv_path, "pip")
 
     # === 3️⃣ Instalar dependencias ===
     req_file = os.path.join(version_path, "requirements.txt")
@@ -55,50 +73,73 @@ def ensure_version(version, versions_dir):
         return process.returncode
 
     # 3.1 Instalar desde requirements.txt o dependencias básicas
-    if os.path.exists(req_file):
-        print(f"Usando {req_file}")
-        result = run_pip(["install", "-r", req_file])
-        if result != 0:
-            print("⚠️ Error instalando requirements.txt, intentando corregir psycopg...")
-            run_pip(["install", "psycopg2-binary"])
-    else:
-        print("requirements.txt no encontrado, instalando dependencias básicas...")
-        run_pip(
-            [
-                "install",
-                "babel",
-                "lxml",
-                "psycopg2-binary",
-                "pytz",
-                "num2words",
-                "passlib",
-                "werkzeug",
-                "requests",
-                "markupsafe",
-            ]
-        )
+    with span("ensure_version.pip_install", version=version):
+        if os.path.exists(req_file):
+            print(f"Usando {req_file}")
+            result = run_pip(["install", "-r", req_file])
+            if result != 0:
+                print("⚠️ Error instalando requirements.txt, intentando corregir psycopg...")
+                run_pip(["install", "psycopg2-binary"])
+        else:
+            print("requirements.txt no encontrado, instalando dependencias básicas...")
+            run_pip(
+                [
+                    "install",
+                    "babel",
+                    "lxml",
+                    "psycopg2-binary",
+                    "pytz",
+                    "num2words",
+                    "passlib",
+                    "werkzeug",
+                    "requests",
+                    "markupsafe",
+                ]
+            )
 
     # 3.2 Verificar que psycopg esté disponible
     print("Verificando instalación de psycopg...")
-    python_exec = os.path.join(
-        venv_path,
-        "Scripts",
-        "python.exe" if platform.system() == "Windows" else "bin/python",
-    )
-    try:
-        subprocess.run([python_exec, "-c", "import psycopg2"], check=True)
-    except subprocess.CalledProcessError:
-        print("⚠️ psycopg2 no disponible, instalando psycopg2-binary...")
-        run_pip(["install", "psycopg2-binary"])
+    python_exec = venv_executable(venv_path, "python")
+    with span("ensure_version.psycopg_check", version=version):
+        try:
+            subprocess.run([python_exec, "-c", "import psycopg2"], check=True)
+        except subprocess.CalledProcessError:
+            print("⚠️ psycopg2 no disponible, instalando psycopg2-binary...")
+            run_pip(["install", "psycopg2-binary"])
+
+    # === 4️⃣ Precompilar bytecode para el primer arranque ===
+    with span("ensure_version.warmup", version=version):
+        warmup_version(version_path, python_exec)
 
     print(f"Odoo {version} preparado correctamente.")
     return version_path
 
 
+@timed("create_instance")
 def create_instance(
-    name, version, versions_dir, instances_dir, db_port=5433, odoo_port=None
+    name,
+    version,
+    versions_dir,
+    instances_dir,
+    db_port=5433,
+    odoo_port=None,
+    use_pooler=False,
 ):
-    config = load_config()
+    # Mientras quede una entrada en la papelera con este nombre, el reaper
+    # mataría los procesos, borraría la carpeta y haría DROP de la base de
+    # datos de la instancia nueva: se reintenta el borrado ahora y, si sigue
+    # pendiente, el nombre no se puede reutilizar aún.
+    if any(entry["name"] == name for entry in load_config().get("trash", [])):
+        from .reaper import retry_pending
+
+        errors = retry_pending(name)
+        if errors:
+            raise RuntimeError(
+                f"La instancia '{name}' se está eliminando todavía ({'; '.join(errors)}). "
+                "Usa otro nombre o descarta su base de datos desde «Papelera» "
+                f"(o con `python cli.py trash --discard {name}`)."
+            )
+
     version_path = ensure_version(version, versions_dir)
 
     inst_dir = os.path.join(instances_dir, name)
@@ -112,6 +153,13 @@ def create_instance(
 
     conf_path = os.path.join(inst_dir, "odoo.conf")
 
+    # 🏊 Con pooler, Odoo se conecta al proxy embebido y no al postmaster
+    # (un pooler por servidor PostgreSQL, cada uno en su puerto).
+    conf_db_host, conf_db_port = "localhost", db_port
+    if use_pooler:
+        pooler_port = pooler_port_for(db_port, load_config().get("instances", []))
+        conf_db_host, conf_db_port = "127.0.0.1", pooler_port
+
     # 🧠 Usuario seguro por defecto
     db_user = "odoo_user"
     db_password = "odoo_pass"
@@ -121,13 +169,14 @@ def create_instance(
             f"""
 [options]
 addons_path = {os.path.join(version_path, 'addons')},{os.path.join(inst_dir, 'addons')}
-db_host = localhost
-db_port = {db_port}
+db_host = {conf_db_host}
+db_port = {conf_db_port}
 db_user = {db_user}
 db_password = {db_password}
 db_name = {name}
 admin_passwd = admin
 xmlrpc_port = {odoo_port}
+proxy_mode = True
 logfile = {os.path.join(inst_dir, 'logs', 'odoo.log')}
 data_dir = {os.path.join(inst_dir, 'data')}
         """
@@ -141,66 +190,169 @@ data_dir = {os.path.join(inst_dir, 'data')}
         "db_port": db_port,
         "status": "stopped",
     }
+    if use_pooler:
+        instance["pooler_port"] = pooler_port
 
     psql_path = os.path.join(BIN_DIR, "psql.exe")
 
     if os.path.exists(psql_path):
         print("Creando usuario 'odoo_user' en PostgreSQL...")
-        subprocess.run(
-            [
-                psql_path,
-                "-U",
-                "postgres",
-                "-p",
-                str(db_port),
-                "-c",
-                f"DO $$ BEGIN IF NOT EXISTS (SELECT FROM pg_catalog.pg_roles WHERE rolname = '{db_user}') THEN CREATE USER {db_user} WITH PASSWORD '{db_password}' CREATEDB; END IF; END $$;",
-            ],
-            check=False,
-        )
+        with span("create_instance.db_user", instance=name):
+            subprocess.run(
+                [
+                    psql_path,
+                    "-U",
+                    "postgres",
+                    "-p",
+                    str(db_port),
+                    "-c",
+                    f"DO $$ BEGIN IF NOT EXISTS (SELECT FROM pg_catalog.pg_roles WHERE rolname = '{db_user}') THEN CREATE USER {db_user} WITH PASSWORD '{db_password}' CREATEDB; END IF; END $$;",
+                ],
+                check=False,
+            )
     else:
         print(
             "⚠️ No se encontró psql.exe, omitiendo creación de usuario (posible instalación del sistema)."
         )
 
-    config["instances"].append(instance)
-    save_config(config)
+    with config_lock:
+        config = load_config()
+        config["instances"].append(instance)
+        save_config(config)
     return instance
 
 
-def run_instance(instance):
-    """Ejecuta Odoo en un proceso separado usando su entorno virtual local."""
-    version_dir = os.path.join(
-        os.path.dirname(__file__), "..", "versions", instance["version"]
-    )
-    conf_path = os.path.join(instance["path"], "odoo.conf")
+def get_version_dir(version):
+    return os.path.join(os.path.dirname(__file__), "..", "versions", version)
 
-    odoo_port = instance.get("odoo_port", 8069)
-    db_port = instance.get("db_port", 5433)
 
-    venv_python = os.path.join(
-        version_dir,
-        "venv",
-        "Scripts",
-        "python.exe" if platform.system() == "Windows" else "bin/python",
-    )
+def get_venv_python(version):
+    """Python del entorno virtual de la versión, o el del sistema si no existe."""
+    venv_python = venv_executable(os.path.join(get_version_dir(version), "venv"), "python")
 
     if not os.path.exists(venv_python):
         print("⚠️ No se encontró el entorno virtual, usando Python del sistema.")
         venv_python = sys.executable
+    return venv_python
 
-    print(
-        f"Iniciando Odoo {instance['version']} en puerto {odoo_port} (DB {db_port})..."
-    )
-    subprocess.Popen(
-        [venv_python, os.path.join(version_dir, "odoo-bin"), "-c", conf_path],
-        cwd=version_dir,
-    )
+
+def run_instance(instance, http_port=None, mode="normal"):
+    """
+    Ejecuta Odoo en un proceso separado usando su entorno virtual local.
+    `http_port` permite sobrescribir el puerto HTTP del odoo.conf (lo usa la
+    activación bajo demanda, que mantiene ocupado el puerto público).
+    Con `mode="profile"` se lanza con el muestreador de pilas cargado y
+    activo (ver core/profiler.py).
+    """
+    version_dir = get_version_dir(instance["version"])
+    conf_path = os.path.join(instance["path"], "odoo.conf")
+
+    odoo_port = http_port or instance.get("odoo_port", 8069)
+    db_port = instance.get("db_port", 5433)
+
+    venv_python = get_venv_python(instance["version"])
+
+    cmd = [venv_python, os.path.join(version_dir, "odoo-bin"), "-c", conf_path]
+    if http_port:
+        cmd += ["-p", str(http_port)]
+
+    # El span cubre todo lo que se hace antes de lanzar Odoo, no solo el Popen.
+    with span("run_instance", instance=instance["name"], mode=mode):
+        if instance.get("pooler_port"):
+            ensure_pooler(db_port, port=instance["pooler_port"])
+
+        env = None
+        if mode == "profile":
+            from .profiler import install_profiler, profile_env
+
+            install_profiler(instance["version"])
+            env = profile_env(instance)
+            print(f"Modo profile: pilas en {env['LOOCAL_PROFILE_DIR']}")
+
+        print(
+            f"Iniciando Odoo {instance['version']} en puerto {odoo_port} (DB {db_port})..."
+        )
+        process = subprocess.Popen(cmd, cwd=version_dir, env=env)
+
+    # Tiempo hasta que Odoo acepta conexiones, medido sin bloquear al llamador
+    threading.Thread(
+        target=_record_ready_time,
+        args=(instance["name"], process, odoo_port, time.time()),
+        daemon=True,
+    ).start()
 
     instance["status"] = "running"
+    return process
 
 
-def full_odoo_setup(progress_cb, log_cb, version, name, versions_dir, instances_dir, db_port=5433):
+def _record_ready_time(name, process, port, started, timeout=300):
+    ready = wait_for_port(port, timeout, alive=lambda: process.poll() is None)
+    record(
+        "instance.ready",
+        time.time() - started,
+        ok=ready,
+        start=started,
+        instance=name,
+    )
+
+
+def update_odoo_conf(conf_path, values):
+    """Actualiza (o añade) opciones de la sección [options] de un odoo.conf."""
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read(conf_path)
+    if not parser.has_section("options"):
+        parser.add_section("options")
+    for key, value in values.items():
+        parser.set("options", key, str(value))
+    with open(conf_path, "w") as f:
+        parser.write(f)
+
+
+def find_instance_processes(instance):
+    """Procesos de Odoo (incluidos workers) lanzados con el odoo.conf de la instancia."""
+    conf_path = os.path.abspath(os.path.join(instance["path"], "odoo.conf"))
+    found = []
+    for proc in psutil.process_iter(["cmdline"]):
+        cmdline = proc.info.get("cmdline") or []
+        if any(os.path.abspath(arg) == conf_path for arg in cmdline if arg.endswith("odoo.conf")):
+            found.append(proc)
+    return found
+
+
+@timed("stop_instance")
+def stop_instance(instance, timeout=30):
+    """Detiene todos los procesos de la instancia. Devuelve True si no queda ninguno."""
+    procs = find_instance_processes(instance)
+    if procs:
+        print(f"Deteniendo instancia {instance['name']}...")
+    for proc in procs:
+        try:
+            proc.terminate()
+        except psutil.NoSuchProcess:
+            pass
+
+    _, alive = psutil.wait_procs(procs, timeout=timeout)
+    for proc in alive:
+        try:
+            proc.kill()
+        except psutil.NoSuchProcess:
+            pass
+    _, alive = psutil.wait_procs(alive, timeout=5)
+
+    instance["status"] = "stopped"
+    return not alive
+
+
+def full_odoo_setup(
+    progress_cb,
+    log_cb,
+    version,
+    name,
+    versions_dir,
+    instances_dir,
+    db_port=5433,
+    use_pooler=False,
+):
     """
     Realiza el proceso completo de configuración de una instancia de Odoo:
     - Verifica o inicia PostgreSQL.
@@ -210,11 +362,11 @@ def full_odoo_setup(progress_cb, log_cb, version, name, versions_dir, instances_
     Todo con feedback visual (progreso y logs).
     """
 
-    import time
     from .postgres_manager import ensure_postgres
     from .utils import load_config, save_config
     from .odoo_manager import ensure_version, create_instance
 
+    setup_started = time.time()
     try:
         # === Paso 1: Verificar PostgreSQL ===
         progress_cb.emit(5, "Verificando PostgreSQL...")
@@ -230,7 +382,7 @@ def full_odoo_setup(progress_cb, log_cb, version, name, versions_dir, instances_
 
         # === Paso 2: Descarga e instalación de Odoo ===
         progress_cb.emit(30, f"Descargando Odoo {version}...")
-        log_cb.emit(f"➡️ Descargando Odoo {version}...")
+        log_cb.emit(f"➡️ Descargando Odoo {version} y precompilando bytecode...")
         version_path = ensure_version(version, versions_dir)
         progress_cb.emit(60, "Odoo descargado e instalado.")
         log_cb.emit("✅ Odoo descargado y dependencias instaladas correctamente.")
@@ -243,16 +395,23 @@ def full_odoo_setup(progress_cb, log_cb, version, name, versions_dir, instances_
             version=version,
             versions_dir=versions_dir,
             instances_dir=instances_dir,
-            db_port=db_port
+            db_port=db_port,
+            use_pooler=use_pooler,
         )
 
         log_cb.emit(f"✅ Instancia creada: {inst['name']} (Odoo {inst['version']})")
         log_cb.emit(f"🌐 Puerto de Odoo: {inst['odoo_port']}")
         log_cb.emit(f"🗄️  Puerto de PostgreSQL: {inst['db_port']}")
+        if inst.get("pooler_port"):
+            log_cb.emit(f"🏊 Conexiones a través del pooler (puerto {inst['pooler_port']})")
         progress_cb.emit(90, "Instancia configurada correctamente.")
 
         # === Paso 4: Finalización ===
         time.sleep(0.5)
+        log_cb.emit("⏱️ Tiempos por paso:")
+        for entry in load_spans(since=setup_started - 1):
+            if entry["pid"] == os.getpid():
+                log_cb.emit(f"   {entry['name']}: {entry['duration']:.1f}s")
         log_cb.emit("🟢 Instalación finalizada con éxito.")
         progress_cb.emit(100, "Completado.")
 
@@ -261,22 +420,31 @@ def full_odoo_setup(progress_cb, log_cb, version, name, versions_dir, instances_
         raise
 
 
+@timed("delete_instance")
 def delete_instance(name, instances_dir):
-    config = load_config()
-    new_instances = []
-    deleted = False
-
-    for inst in config["instances"]:
-        if inst["name"] == name:
-            inst_path = inst["path"]
-            if os.path.exists(inst_path):
-                print(f"Eliminando instancia {name}...")
-                shutil.rmtree(inst_path, ignore_errors=True)
-            deleted = True
-        else:
-            new_instances.append(inst)
+    """
+    Elimina una instancia de forma inmediata: mueve su carpeta a la papelera y
+    la quita del registro. Los ficheros y la base de datos se eliminan después
+    en segundo plano (ver core/reaper.py).
+    """
+    from .reaper import move_to_trash, schedule_reap
 
+    with config_lock:
+        config = load_config()
+        new_instances = []
+        deleted = False
+
+        for inst in config["instances"]:
+            if inst["name"] == name:
+                print(f"Eliminando instancia {name}...")
+                config.setdefault("trash", []).append(move_to_trash(inst, instances_dir))
+                deleted = True
+            else:
+                new_instances.append(inst)
+
+        if deleted:
+            config["instances"] = new_instances
+            save_config(config)
     if deleted:
-        config["instances"] = new_instances
-        save_config(config)
+        schedule_reap()
     return deleted
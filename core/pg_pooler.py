@@ -0,0 +1,707 @@
+"""
+Pooler de conexiones PostgreSQL embebido (modo transacción).
+
+Las instancias de Odoo se conectan al pooler en lugar de al postmaster. Cada
+cliente solo ocupa un backend real mientras tiene una transacción abierta; al
+recibir ReadyForQuery en estado inactivo ('I') el backend vuelve al pool y
+puede ser usado por otro cliente de la misma base de datos.
+
+Limitaciones propias del modo transacción:
+- El estado de sesión (SET, prepared statements con nombre, tablas temporales)
+  no se conserva entre transacciones.
+- Un cliente que ejecuta LISTEN queda fijado a su backend hasta desconectarse,
+  para que las notificaciones del bus de Odoo sigan llegando.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import struct
+import time
+from collections import deque
+
+from .async_loop import run_coroutine
+
+POOLER_PORT = 6432
+DEFAULT_POOL_SIZE = 10
+DEFAULT_IDLE_TIMEOUT = 60
+# Como query_wait_timeout de PgBouncer: tiempo máximo esperando un backend libre.
+DEFAULT_WAIT_TIMEOUT = 120
+# Como server_check_delay: backends inactivos más tiempo se comprueban antes de reusarlos.
+SERVER_CHECK_DELAY = 30
+
+SSL_REQUEST_CODE = 80877103
+GSSENC_REQUEST_CODE = 80877104
+CANCEL_REQUEST_CODE = 80877102
+PROTOCOL_VERSION = 196608
+
+_poolers = {}  # puerto de escucha → PgPooler (uno por servidor PostgreSQL)
+
+
+class PoolerError(Exception):
+    """Error reportado por el servidor o por el propio pooler."""
+
+    def __init__(self, message, code="08006"):
+        super().__init__(message)
+        self.code = code
+
+
+# === 📦 Utilidades del protocolo ===
+async def read_message(reader):
+    """Lee un mensaje tipado del protocolo v3 y devuelve (tipo, cuerpo)."""
+    header = await reader.readexactly(5)
+    msg_type = header[:1]
+    length = struct.unpack("!I", header[1:])[0]
+    body = await reader.readexactly(length - 4) if length > 4 else b""
+    return msg_type, body
+
+
+def build_message(msg_type, body=b""):
+    return msg_type + struct.pack("!I", len(body) + 4) + body
+
+
+def build_error(message, code="08006", severity="FATAL"):
+    fields = b""
+    for key, value in (("S", severity), ("V", severity), ("C", code), ("M", message)):
+        fields += key.encode() + value.encode() + b"\x00"
+    return build_message(b"E", fields + b"\x00")
+
+
+def parse_error(body):
+    """Extrae (mensaje, código SQLSTATE) de un ErrorResponse."""
+    fields = {}
+    for part in body.split(b"\x00"):
+        if part:
+            fields[part[:1].decode()] = part[1:].decode(errors="replace")
+    return fields.get("M", "error desconocido"), fields.get("C", "08006")
+
+
+def build_startup(params):
+    body = struct.pack("!I", PROTOCOL_VERSION)
+    for key, value in params.items():
+        body += key.encode() + b"\x00" + value.encode() + b"\x00"
+    body += b"\x00"
+    return struct.pack("!I", len(body) + 4) + body
+
+
+# === 🔐 Autenticación contra el servidor ===
+def _md5_password(user, password, salt):
+    inner = hashlib.md5((password + user).encode()).hexdigest()
+    return "md5" + hashlib.md5(inner.encode() + salt).hexdigest()
+
+
+class _ScramClient:
+    """Cliente SCRAM-SHA-256 mínimo (RFC 5802 / RFC 7677)."""
+
+    def __init__(self, password):
+        self.password = password
+        self.nonce = base64.b64encode(os.urandom(18)).decode()
+        self.client_first_bare = f"n=,r={self.nonce}"
+        self.auth_message = None
+        self.salted = None
+
+    def first_message(self):
+        return ("n,," + self.client_first_bare).encode()
+
+    def final_message(self, server_first):
+        server_first = server_first.decode()
+        attrs = dict(item.split("=", 1) for item in server_first.split(","))
+        if not attrs["r"].startswith(self.nonce):
+            raise PoolerError("Nonce SCRAM inválido recibido del servidor.", "28000")
+
+        self.salted = hashlib.pbkdf2_hmac(
+            "sha256",
+            self.password.encode(),
+            base64.b64decode(attrs["s"]),
+            int(attrs["i"]),
+        )
+        client_key = hmac.new(self.salted, b"Client Key", "sha256").digest()
+        stored_key = hashlib.sha256(client_key).digest()
+        without_proof = f"c=biws,r={attrs['r']}"
+        self.auth_message = (
+            f"{self.client_first_bare},{server_first},{without_proof}"
+        ).encode()
+        signature = hmac.new(stored_key, self.auth_message, "sha256").digest()
+        proof = bytes(a ^ b for a, b in zip(client_key, signature))
+        return f"{without_proof},p={base64.b64encode(proof).decode()}".encode()
+
+    def verify(self, server_final):
+        attrs = dict(item.split("=", 1) for item in server_final.decode().split(","))
+        server_key = hmac.new(self.salted, b"Server Key", "sha256").digest()
+        expected = hmac.new(server_key, self.auth_message, "sha256").digest()
+        if base64.b64decode(attrs.get("v", "")) != expected:
+            raise PoolerError("Firma SCRAM del servidor inválida.", "28000")
+
+
+# === 🔌 Conexión a un backend real ===
+class ServerConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.parameters = {}
+        self.backend_key = None
+        self.last_used = time.monotonic()
+
+    @classmethod
+    async def connect(cls, host, port, user, database, password):
+        reader, writer = await asyncio.open_connection(host, port)
+        conn = cls(reader, writer)
+        try:
+            await conn._startup(user, database, password)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    async def _startup(self, user, database, password):
+        self.writer.write(
+            build_startup(
+                {
+                    "user": user,
+                    "database": database,
+                    "client_encoding": "UTF8",
+                    "application_name": "loocal-pooler",
+                }
+            )
+        )
+        await self.writer.drain()
+
+        scram = None
+        while True:
+            msg_type, body = await read_message(self.reader)
+            if msg_type == b"E":
+                raise PoolerError(*parse_error(body))
+            if msg_type == b"R":
+                code = struct.unpack("!I", body[:4])[0]
+                if code == 0:
+                    continue
+                if code == 3:
+                    self._send_password(password.encode() + b"\x00")
+                elif code == 5:
+                    self._send_password(
+                        _md5_password(user, password, body[4:8]).encode() + b"\x00"
+                    )
+                elif code == 10:
+                    if b"SCRAM-SHA-256\x00" not in body[4:]:
+                        raise PoolerError("Mecanismo SASL no soportado.", "28000")
+                    scram = _ScramClient(password)
+                    first = scram.first_message()
+                    self._send_password(
+                        b"SCRAM-SHA-256\x00" + struct.pack("!I", len(first)) + first
+                    )
+                elif code == 11:
+                    self._send_password(scram.final_message(body[4:]))
+                elif code == 12:
+                    scram.verify(body[4:])
+                else:
+                    raise PoolerError(
+                        f"Método de autenticación {code} no soportado.", "28000"
+                    )
+                await self.writer.drain()
+            elif msg_type == b"S":
+                key, value = body.rstrip(b"\x00").split(b"\x00", 1)
+                self.parameters[key.decode()] = value.decode()
+            elif msg_type == b"K":
+                self.backend_key = body
+            elif msg_type == b"Z":
+                return
+
+    def _send_password(self, payload):
+        self.writer.write(build_message(b"p", payload))
+
+    @property
+    def closed(self):
+        # Tras un EOF del servidor el transporte no se marca como cerrado. Un
+        # backend inactivo tampoco debería tener nada pendiente de leer: si lo
+        # hay suele ser el FATAL de pg_terminate_backend o de un reinicio.
+        return (
+            self.writer.is_closing()
+            or self.reader.at_eof()
+            or bool(getattr(self.reader, "_buffer", b""))
+        )
+
+    async def check(self, timeout=5):
+        """Ida y vuelta con Sync; False si el backend ya no responde."""
+        try:
+            self.writer.write(build_message(b"S"))
+            await self.writer.drain()
+            while True:
+                msg_type, _ = await asyncio.wait_for(read_message(self.reader), timeout)
+                if msg_type == b"E":
+                    return False
+                if msg_type == b"Z":
+                    return True
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            return False
+
+    def close(self):
+        if not self.writer.is_closing():
+            try:
+                self.writer.write(build_message(b"X"))
+            except Exception:
+                pass
+            self.writer.close()
+
+
+# === 🏊 Pool por (usuario, base de datos) ===
+class ServerPool:
+    def __init__(self, pooler, user, database, password):
+        self.pooler = pooler
+        self.user = user
+        self.database = database
+        self.password = password
+        self.idle = deque()
+        self.total = 0
+        self.waiting = 0
+        self.clients = 0
+        self.condition = asyncio.Condition()
+        # ParameterStatus del primer backend: los clientes siguientes con las
+        # mismas credenciales no necesitan ocupar un backend para conectarse.
+        self.parameters = None
+        self.stats = {
+            "transactions": 0,
+            "queries": 0,
+            "wait_time": 0.0,
+            "acquires": 0,
+        }
+
+    async def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.pooler.wait_timeout
+        while True:
+            conn = await self._reserve(deadline)
+            if conn is None:
+                break
+            if (
+                time.monotonic() - conn.last_used < self.pooler.check_delay
+                or await conn.check()
+            ):
+                self._account_wait(started)
+                return conn
+            await self.release(conn, reusable=False)
+
+        try:
+            conn = await ServerConnection.connect(
+                self.pooler.server_host,
+                self.pooler.server_port,
+                self.user,
+                self.database,
+                self.password,
+            )
+        except BaseException:
+            async with self.condition:
+                self.total -= 1
+                self.condition.notify()
+            raise
+        self.parameters = dict(conn.parameters)
+        self._account_wait(started)
+        return conn
+
+    async def _reserve(self, deadline):
+        """
+        Devuelve un backend inactivo, o None si hay hueco para abrir uno nuevo
+        (el hueco queda reservado en `total`). Espera hasta `deadline`.
+        """
+        async with self.condition:
+            while True:
+                while self.idle:
+                    conn = self.idle.pop()
+                    if not conn.closed:
+                        return conn
+                    conn.close()
+                    self.total -= 1
+                if self.total < self.pooler.pool_size:
+                    self.total += 1
+                    return None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolerError(
+                        f"Sin backends libres para '{self.database}' tras "
+                        f"{self.pooler.wait_timeout}s (pool de {self.pooler.pool_size}).",
+                        "53300",
+                    )
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(self.condition.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    self.waiting -= 1
+
+    def _account_wait(self, started):
+        self.stats["acquires"] += 1
+        self.stats["wait_time"] += time.monotonic() - started
+
+    async def release(self, conn, reusable=True):
+        async with self.condition:
+            if reusable and not conn.closed:
+                conn.last_used = time.monotonic()
+                self.idle.append(conn)
+            else:
+                conn.close()
+                self.total -= 1
+            self.condition.notify()
+
+    async def close_idle(self, older_than=0):
+        """Cierra los backends inactivos durante más de `older_than` segundos."""
+        now = time.monotonic()
+        async with self.condition:
+            keep = deque()
+            for conn in self.idle:
+                if now - conn.last_used >= older_than or conn.closed:
+                    conn.close()
+                    self.total -= 1
+                else:
+                    keep.append(conn)
+            self.idle = keep
+
+    def snapshot(self):
+        acquires = self.stats["acquires"] or 1
+        return {
+            "user": self.user,
+            "database": self.database,
+            "clients": self.clients,
+            "servers_total": self.total,
+            "servers_idle": len(self.idle),
+            "servers_active": self.total - len(self.idle),
+            "waiting": self.waiting,
+            "transactions": self.stats["transactions"],
+            "queries": self.stats["queries"],
+            "avg_wait_ms": round(self.stats["wait_time"] / acquires * 1000, 3),
+        }
+
+
+# === 🔀 Sesión de un cliente ===
+class ClientSession:
+    def __init__(self, pooler, reader, writer):
+        self.pooler = pooler
+        self.reader = reader
+        self.writer = writer
+        self.pool = None
+        self.server = None
+        self.server_task = None
+        self.pending_syncs = 0
+        self.mid_batch = False
+        self.pinned = False
+        self.backend_key = os.urandom(8)
+
+    async def run(self):
+        try:
+            if not await self._handshake():
+                return
+            self.pooler.sessions[self.backend_key] = self
+            await self._client_loop()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except PoolerError as e:
+            self._send_fatal(str(e), e.code)
+        finally:
+            self.pooler.sessions.pop(self.backend_key, None)
+            await self._detach(reusable=False)
+            if self.pool:
+                self.pool.clients -= 1
+            self.writer.close()
+
+    async def _handshake(self):
+        while True:
+            length = struct.unpack("!I", await self.reader.readexactly(4))[0]
+            payload = await self.reader.readexactly(length - 4)
+            code = struct.unpack("!I", payload[:4])[0]
+            if code in (SSL_REQUEST_CODE, GSSENC_REQUEST_CODE):
+                self.writer.write(b"N")
+                await self.writer.drain()
+                continue
+            if code == CANCEL_REQUEST_CODE:
+                await self.pooler.forward_cancel(payload[4:12])
+                return False
+            if code != PROTOCOL_VERSION:
+                self._send_fatal("Versión de protocolo no soportada.", "0A000")
+                return False
+            break
+
+        items = payload[4:].split(b"\x00")
+        params = {
+            items[i].decode(): items[i + 1].decode()
+            for i in range(0, len(items) - 1, 2)
+            if items[i]
+        }
+        user = params.get("user", "")
+        database = params.get("database", user)
+
+        # Pedimos la contraseña en claro (solo loopback) y la validamos
+        # abriendo o reutilizando un backend con esas credenciales.
+        self.writer.write(build_message(b"R", struct.pack("!I", 3)))
+        await self.writer.drain()
+        msg_type, body = await read_message(self.reader)
+        if msg_type != b"p":
+            self._send_fatal("Se esperaba un mensaje de contraseña.", "28000")
+            return False
+        password = body.rstrip(b"\x00").decode()
+
+        self.pool = self.pooler.get_pool(user, database, password)
+        self.pool.clients += 1
+        if self.pool.parameters is None:
+            # Primera conexión con estas credenciales: se validan abriendo un
+            # backend. Las siguientes no compiten por el pool en el handshake.
+            server = await self.pool.acquire()
+            await self.pool.release(server)
+        parameters = self.pool.parameters
+
+        out = build_message(b"R", struct.pack("!I", 0))
+        for key, value in parameters.items():
+            out += build_message(
+                b"S", key.encode() + b"\x00" + value.encode() + b"\x00"
+            )
+        out += build_message(b"K", self.backend_key)
+        out += build_message(b"Z", b"I")
+        self.writer.write(out)
+        await self.writer.drain()
+        return True
+
+    async def _client_loop(self):
+        while True:
+            msg_type, body = await read_message(self.reader)
+            if msg_type == b"X":
+                return
+
+            if self.server is None:
+                self.server = await self.pool.acquire()
+                self.server_task = asyncio.create_task(self._server_loop(self.server))
+
+            if msg_type in (b"Q", b"S"):
+                self.pending_syncs += 1
+                self.mid_batch = False
+                self.pool.stats["queries"] += 1
+                if msg_type == b"Q" and body.lstrip()[:6].upper() == b"LISTEN":
+                    self.pinned = True
+            elif msg_type not in (b"d", b"c", b"f", b"H"):
+                self.mid_batch = True
+
+            self.server.writer.write(build_message(msg_type, body))
+            await self.server.writer.drain()
+
+    async def _server_loop(self, server):
+        try:
+            while True:
+                msg_type, body = await read_message(server.reader)
+                self.writer.write(build_message(msg_type, body))
+                await self.writer.drain()
+                if msg_type == b"Z":
+                    self.pending_syncs = max(0, self.pending_syncs - 1)
+                    if (
+                        body == b"I"
+                        and self.pending_syncs == 0
+                        and not self.mid_batch
+                        and not self.pinned
+                    ):
+                        self.pool.stats["transactions"] += 1
+                        self.server = None
+                        self.server_task = None
+                        await self.pool.release(server)
+                        return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # El backend murió: cerramos también al cliente.
+            self.writer.close()
+
+    async def _detach(self, reusable):
+        """Libera el backend asignado. Si hay transacción a medias se descarta."""
+        server, self.server = self.server, None
+        task, self.server_task = self.server_task, None
+        if task and not task.done():
+            task.cancel()
+        if server is not None:
+            await self.pool.release(server, reusable=reusable)
+
+    def _send_fatal(self, message, code):
+        try:
+            self.writer.write(build_error(message, code))
+        except Exception:
+            pass
+
+
+# === 🚦 Pooler ===
+class PgPooler:
+    def __init__(
+        self,
+        server_port,
+        listen_port=POOLER_PORT,
+        listen_host="127.0.0.1",
+        server_host="127.0.0.1",
+        pool_size=DEFAULT_POOL_SIZE,
+        idle_timeout=DEFAULT_IDLE_TIMEOUT,
+        wait_timeout=DEFAULT_WAIT_TIMEOUT,
+        check_delay=SERVER_CHECK_DELAY,
+    ):
+        self.server_port = server_port
+        self.server_host = server_host
+        self.listen_port = listen_port
+        self.listen_host = listen_host
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.check_delay = check_delay
+        self.pools = {}
+        self.sessions = {}
+        self._server = None
+        self._reaper = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._on_client, self.listen_host, self.listen_port
+        )
+        self._reaper = asyncio.create_task(self._reap_idle())
+        print(
+            f"Pooler PostgreSQL escuchando en {self.listen_host}:{self.listen_port} "
+            f"→ {self.server_host}:{self.server_port}"
+        )
+
+    async def stop(self):
+        if self._reaper:
+            self._reaper.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for pool in self.pools.values():
+            await pool.close_idle()
+
+    def get_pool(self, user, database, password):
+        key = (user, database, hashlib.sha256(password.encode()).hexdigest())
+        if key not in self.pools:
+            self.pools[key] = ServerPool(self, user, database, password)
+        return self.pools[key]
+
+    async def close_database(self, database):
+        """Cierra los backends inactivos de una base (por ejemplo antes de DROP DATABASE)."""
+        for pool in self.pools.values():
+            if pool.database == database:
+                await pool.close_idle()
+
+    async def forward_cancel(self, key):
+        session = self.sessions.get(key)
+        server = session.server if session else None
+        if server is None or server.backend_key is None:
+            return
+        _, writer = await asyncio.open_connection(self.server_host, self.server_port)
+        writer.write(
+            struct.pack("!II", 16, CANCEL_REQUEST_CODE) + server.backend_key
+        )
+        await writer.drain()
+        writer.close()
+
+    def stats(self):
+        """Estadísticas agrupadas por base de datos (una por instancia)."""
+        result = {}
+        for pool in self.pools.values():
+            snap = pool.snapshot()
+            entry = result.setdefault(snap["database"], dict.fromkeys(snap, 0))
+            for key, value in snap.items():
+                if key in ("user", "database"):
+                    entry[key] = value
+                else:
+                    entry[key] += value
+        return result
+
+    async def _on_client(self, reader, writer):
+        await ClientSession(self, reader, writer).run()
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(max(1, self.idle_timeout / 4))
+            for pool in list(self.pools.values()):
+                await pool.close_idle(self.idle_timeout)
+
+
+# === ⚙️ API síncrona para el gestor ===
+def pooler_port_for(db_port, instances):
+    """
+    Puerto del pooler para un servidor PostgreSQL: el que ya usan otras
+    instancias de ese servidor, o el primero libre a partir de POOLER_PORT.
+    """
+    used = {}
+    for inst in instances:
+        if inst.get("pooler_port"):
+            used[inst["pooler_port"]] = inst.get("db_port", 5433)
+    for port, server_port in used.items():
+        if server_port == db_port:
+            return port
+    port = POOLER_PORT
+    while port in used:
+        port += 1
+    return port
+
+
+def ensure_pooler(server_port, port=POOLER_PORT, **kwargs):
+    """
+    Inicia en el bucle de fondo el pooler de `port` hacia `server_port`, si aún
+    no está en marcha. Cada servidor PostgreSQL tiene su propio puerto de pooler.
+    """
+    pooler = _poolers.get(port)
+    if pooler is not None:
+        if pooler.server_port != server_port:
+            raise PoolerError(
+                f"El pooler del puerto {port} ya apunta a PostgreSQL en el puerto "
+                f"{pooler.server_port}, no en {server_port}.",
+                "08001",
+            )
+        return pooler
+
+    pooler = PgPooler(server_port, listen_port=port, **kwargs)
+    run_coroutine(pooler.start(), timeout=10)
+    _poolers[port] = pooler
+    return pooler
+
+
+def stop_pooler():
+    if not _poolers:
+        return
+    print("Deteniendo pooler PostgreSQL...")
+    for port in list(_poolers):
+        run_coroutine(_poolers.pop(port).stop(), timeout=10)
+
+
+def get_pooler_stats():
+    """Devuelve las estadísticas por instancia, o {} si no hay ningún pooler activo."""
+    stats = {}
+    for pooler in list(_poolers.values()):
+        stats.update(run_coroutine(_async_stats(pooler), timeout=5))
+    return stats
+
+
+async def _async_stats(pooler):
+    return pooler.stats()
+
+
+def close_pooled_database(database, server_port=None):
+    for pooler in list(_poolers.values()):
+        if server_port is None or pooler.server_port == server_port:
+            run_coroutine(pooler.close_database(database), timeout=10)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pooler PostgreSQL de loocal")
+    parser.add_argument("--port", type=int, default=POOLER_PORT)
+    parser.add_argument("--server-port", type=int, default=5433)
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument("--idle-timeout", type=int, default=DEFAULT_IDLE_TIMEOUT)
+    parser.add_argument("--wait-timeout", type=int, default=DEFAULT_WAIT_TIMEOUT)
+    args = parser.parse_args()
+
+    ensure_pooler(
+        args.server_port,
+        port=args.port,
+        pool_size=args.pool_size,
+        idle_timeout=args.idle_timeout,
+        wait_timeout=args.wait_timeout,
+    )
+    try:
+        while True:
+            time.sleep(10)
+            for db, stats in get_pooler_stats().items():
+                print(f"[{db}] {stats}")
+    except KeyboardInterrupt:
+        stop_pooler()
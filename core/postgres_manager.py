@@ -11,6 +11,8 @@ import sys
 import psutil
 import socket
 
+from .telemetry import span, timed
+
 # Si estamos en Linux o mac, importaremos pg-embed dinámicamente.
 if platform.system() != "Windows":
     try:
@@ -141,6 +143,7 @@ def download_postgres_zip(url, dest_folder, version="unknown"):
     print("PostgreSQL portable listo y verificado.")
 
 # === ⚙️ Inicialización y arranque ===
+@timed("ensure_postgres")
 def ensure_postgres():
     """
     Garantiza que PostgreSQL esté disponible:
@@ -164,25 +167,27 @@ def ensure_postgres():
             os.makedirs(PG_DIR, exist_ok=True)
             zip_url, version = get_latest_postgres_zip_url()
             print(f"Descargando PostgreSQL v{version} portable (Windows)...")
-            download_postgres_zip(zip_url, PG_DIR)
+            with span("ensure_postgres.download", version=version):
+                download_postgres_zip(zip_url, PG_DIR)
 
         # Inicializar data si no existe
         if not os.path.exists(DATA_DIR):
             print("Inicializando base de datos PostgreSQL portable...")
-            subprocess.run(
-                [
-                    os.path.join(BIN_DIR, "initdb.exe"),
-                    "-D",
-                    DATA_DIR,
-                    "-U",
-                    "postgres",
-                    "-A",
-                    "trust",
-                    "--locale=C",
-                    "--encoding=UTF8",
-                ],
-                check=True,
-            )
+            with span("ensure_postgres.initdb"):
+                subprocess.run(
+                    [
+                        os.path.join(BIN_DIR, "initdb.exe"),
+                        "-D",
+                        DATA_DIR,
+                        "-U",
+                        "postgres",
+                        "-A",
+                        "trust",
+                        "--locale=C",
+                        "--encoding=UTF8",
+                    ],
+                    check=True,
+                )
 
         def is_postgres_running(port=PG_PORT):
             """Verifica si ya hay un proceso de PostgreSQL corriendo en el puerto dado."""
@@ -195,13 +200,14 @@ def ensure_postgres():
             return {"port": PG_PORT}
 
         print("Iniciando PostgreSQL portable...")
-        pg_process = subprocess.Popen([
-            os.path.join(BIN_DIR, "pg_ctl.exe"),
-            "-D", DATA_DIR,
-            "-o", f"-p {PG_PORT}",
-            "start"
-        ])
-        time.sleep(3)
+        with span("ensure_postgres.start"):
+            pg_process = subprocess.Popen([
+                os.path.join(BIN_DIR, "pg_ctl.exe"),
+                "-D", DATA_DIR,
+                "-o", f"-p {PG_PORT}",
+                "start"
+            ])
+            time.sleep(3)
 
         if not is_postgres_running(PG_PORT):
             raise RuntimeError("PostgreSQL no pudo iniciarse correctamente.")
@@ -220,8 +226,10 @@ def ensure_postgres():
 
         print("Iniciando PostgreSQL embebido (pg-embed)...")
         pg_instance = PostgresDatabase(version="15.5")
-        pg_instance.setup()
-        pg_instance.start()
+        with span("ensure_postgres.setup"):
+            pg_instance.setup()
+        with span("ensure_postgres.start"):
+            pg_instance.start()
         print(f"PostgreSQL embebido en el puerto {pg_instance.port}")
         return {"port": pg_instance.port}
 
@@ -0,0 +1,162 @@
+"""
+Modo "profile" de las instancias: instalación del muestreador y control.
+
+`install_profiler` deja en el site-packages del entorno virtual de la versión
+el módulo `loocal_sampler` (copia de `sampler_agent.py`) y un `loocal_sampler.pth`
+que lo arranca. Se usa un .pth y no `sitecustomize.py` porque `site` ejecuta
+todos los .pth del site-packages, mientras que del sitecustomize solo se
+importa el primero del sys.path (en Debian/Ubuntu el de /usr/lib/python3.X
+tapa al del entorno virtual). El gancho no hace nada salvo que la instancia
+se lance con `run_instance(..., mode="profile")`, que define LOOCAL_PROFILE_DIR
+apuntando a `instances/<nombre>/profiles/`. El muestreo se enciende y apaga en
+caliente con `set_profiling` / `toggle_profiling`.
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+
+import psutil
+
+from .odoo_manager import find_instance_processes, get_venv_python
+from .sampler_agent import CONTROL_FILENAME, PROFILE_ENV, TOGGLE_SIGNAL
+from .warmup import venv_info
+
+AGENT_SOURCE = os.path.join(os.path.dirname(__file__), "sampler_agent.py")
+AGENT_MODULE = "loocal_sampler"
+# `site` solo ejecuta las líneas de un .pth que empiezan por "import": todo
+# el gancho va en una línea y sin la variable no importa el muestreador.
+HOOK = (
+    f'import os; os.environ.get("{PROFILE_ENV}") '
+    f'and __import__("{AGENT_MODULE}").bootstrap()\n'
+)
+
+
+def install_profiler(version):
+    """
+    Copia el muestreador al entorno virtual y deja el .pth que lo arranca
+    (idempotente). Devuelve False, avisando, si el gancho no llega a cargarse.
+    """
+    venv_python = get_venv_python(version)
+    _, purelib = venv_info(venv_python)
+    shutil.copyfile(AGENT_SOURCE, os.path.join(purelib, f"{AGENT_MODULE}.py"))
+    with open(os.path.join(purelib, f"{AGENT_MODULE}.pth"), "w", encoding="utf-8") as f:
+        f.write(HOOK)
+    return _check_hook(venv_python)
+
+
+def _check_hook(venv_python):
+    """Comprueba con el Python del entorno que el gancho se carga al arrancar."""
+    with tempfile.TemporaryDirectory(prefix="loocal-profile-check-") as directory:
+        env = dict(os.environ)
+        env[PROFILE_ENV] = directory
+        try:
+            result = subprocess.run(
+                [venv_python, "-c", f"import sys; print('{AGENT_MODULE}' in sys.modules)"],
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=30,
+            )
+            loaded = result.stdout.strip() == "True"
+        except (OSError, subprocess.SubprocessError):
+            loaded = False
+    if not loaded:
+        print(
+            f"⚠️ El muestreador no se carga en {venv_python}: la instancia se "
+            "lanzará sin perfilado (¿el intérprete se ejecuta con -S o -I?)."
+        )
+    return loaded
+
+
+def profile_dir(instance):
+    return os.path.join(instance["path"], "profiles")
+
+
+def profile_env(instance, enabled=True):
+    """Variables de entorno para lanzar la instancia en modo profile."""
+    directory = profile_dir(instance)
+    os.makedirs(directory, exist_ok=True)
+    _set_control(directory, enabled)
+    env = dict(os.environ)
+    env[PROFILE_ENV] = directory
+    return env
+
+
+def _set_control(directory, enabled):
+    control = os.path.join(directory, CONTROL_FILENAME)
+    if enabled:
+        open(control, "a").close()
+    elif os.path.exists(control):
+        os.remove(control)
+
+
+def profiled_processes(instance):
+    """Procesos de la instancia lanzados en modo profile."""
+    found = []
+    for proc in find_instance_processes(instance):
+        try:
+            if PROFILE_ENV in proc.environ():
+                found.append(proc)
+        except psutil.Error:
+            pass
+    return found
+
+
+def is_profiling(instance):
+    return os.path.exists(os.path.join(profile_dir(instance), CONTROL_FILENAME))
+
+
+def set_profiling(instance, enabled):
+    """
+    Enciende o apaga el muestreo de una instancia lanzada en modo profile.
+    Devuelve el número de procesos avisados por señal (0 en Windows, donde
+    los procesos releen el fichero de control por su cuenta).
+    """
+    directory = profile_dir(instance)
+    os.makedirs(directory, exist_ok=True)
+    _set_control(directory, enabled)
+
+    if TOGGLE_SIGNAL is None:
+        return 0
+    notified = 0
+    # Sin el muestreador cargado la acción por defecto de SIGUSR2 es terminar
+    # el proceso: solo se avisa a los lanzados en modo profile.
+    for proc in profiled_processes(instance):
+        try:
+            proc.send_signal(TOGGLE_SIGNAL)
+            notified += 1
+        except psutil.Error:
+            pass
+    return notified
+
+
+def toggle_profiling(instance):
+    """Invierte el estado del muestreo. Devuelve el nuevo estado."""
+    enabled = not is_profiling(instance)
+    set_profiling(instance, enabled)
+    return enabled
+
+
+def list_profiles(instance):
+    """Ficheros collapsed generados (uno por proceso/worker)."""
+    return sorted(glob.glob(os.path.join(profile_dir(instance), "profile-*.collapsed")))
+
+
+def merge_profiles(instance, output=None):
+    """Suma los ficheros de todos los workers en uno solo para el flamegraph."""
+    counts = {}
+    for path in list_profiles(instance):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack and count.isdigit():
+                    counts[stack] = counts.get(stack, 0) + int(count)
+
+    output = output or os.path.join(profile_dir(instance), "merged.collapsed")
+    with open(output, "w", encoding="utf-8") as f:
+        for stack, count in sorted(counts.items()):
+            f.write(f"{stack} {count}\n")
+    return output
@@ -0,0 +1,334 @@
+"""
+Limpieza en segundo plano de instancias eliminadas.
+
+`delete_instance` solo renombra la carpeta a `instances/.trash/` y anota la
+entrada en `config["trash"]`. Este módulo completa el trabajo fuera del hilo
+de Qt: espera a que los procesos de la instancia estén detenidos, borra los
+ficheros con prioridad de E/S reducida y ejecuta DROP DATABASE. Cada paso se
+registra en la entrada, así que un borrado interrumpido se retoma en el
+siguiente arranque del gestor.
+
+La base de datos se elimina por TCP con el rol de la instancia (el de su
+odoo.conf, que es quien la creó y la posee), con psql si está disponible o
+con el psycopg2 del entorno virtual de la versión si no.
+
+Las entradas se identifican por el nombre de la instancia (procesos, base de
+datos), así que `create_instance` reintenta el borrado pendiente de ese nombre
+y, si sigue fallando, lo rechaza hasta que se complete o se descarte la base
+de datos (`discard_database`, `python cli.py trash --discard`).
+"""
+
+import configparser
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+import psutil
+
+from .odoo_manager import get_venv_python, stop_instance
+from .pg_pooler import close_pooled_database
+from .postgres_manager import BIN_DIR
+from .telemetry import span
+from .utils import config_lock, load_config, save_config
+
+TRASH_DIR_NAME = ".trash"
+FILES_PER_BATCH = 200
+BATCH_PAUSE = 0.02
+SQL_TIMEOUT = 60
+DEFAULT_DB_USER = "odoo_user"
+DEFAULT_DB_PASSWORD = "odoo_pass"
+PSYCOPG_SCRIPT = """
+import sys, psycopg2
+conn = psycopg2.connect(
+    host="127.0.0.1", port=sys.argv[1], user=sys.argv[2], dbname="postgres", connect_timeout=10
+)
+conn.autocommit = True
+cur = conn.cursor()
+cur.execute(sys.argv[3])
+if cur.description:
+    print(cur.fetchone()[0])
+"""
+
+_reaper_thread = None
+_reaper_lock = threading.Lock()
+# Un reintento desde create_instance no debe pisarse con el hilo del reaper.
+_reap_lock = threading.Lock()
+
+
+def find_psql():
+    for candidate in (
+        os.path.join(BIN_DIR, "psql.exe"),
+        os.path.join(BIN_DIR, "psql"),
+        shutil.which("psql"),
+    ):
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _lower_io_priority():
+    """Baja la prioridad de E/S del hilo actual (Linux) para no competir con Odoo."""
+    try:
+        if hasattr(psutil, "IOPRIO_CLASS_IDLE") and hasattr(threading, "get_native_id"):
+            psutil.Process(threading.get_native_id()).ionice(psutil.IOPRIO_CLASS_IDLE)
+    except (psutil.Error, OSError, ValueError):
+        pass
+
+
+def _remove_tree(path):
+    """Borra un árbol en lotes, con pausas cortas para acotar el ritmo de E/S."""
+    removed = 0
+    for root, dirs, files in os.walk(path, topdown=False):
+        for filename in files:
+            try:
+                os.remove(os.path.join(root, filename))
+            except FileNotFoundError:
+                pass
+            except PermissionError:
+                os.chmod(os.path.join(root, filename), 0o700)
+                os.remove(os.path.join(root, filename))
+            removed += 1
+            if removed % FILES_PER_BATCH == 0:
+                time.sleep(BATCH_PAUSE)
+        for dirname in dirs:
+            full = os.path.join(root, dirname)
+            if os.path.islink(full):
+                os.remove(full)
+            else:
+                os.rmdir(full)
+    os.rmdir(path)
+
+
+def _db_credentials(conf_path):
+    """Usuario y contraseña de PostgreSQL del odoo.conf de la instancia."""
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        parser.read(conf_path)
+    except configparser.Error:
+        pass
+    return (
+        parser.get("options", "db_user", fallback=DEFAULT_DB_USER),
+        parser.get("options", "db_password", fallback=DEFAULT_DB_PASSWORD),
+    )
+
+
+def _run_sql(entry, sql):
+    """
+    Ejecuta `sql` en la base de datos "postgres" del servidor de la entrada,
+    por TCP y con el rol de la instancia. Devuelve la primera columna de la
+    primera fila (o ""); lanza RuntimeError con el mensaje del servidor.
+    """
+    env = dict(os.environ)
+    env["PGPASSWORD"] = entry.get("db_password", DEFAULT_DB_PASSWORD)
+    env["PGCONNECT_TIMEOUT"] = "10"
+    port = str(entry["db_port"])
+    user = entry.get("db_user", DEFAULT_DB_USER)
+
+    psql_path = find_psql()
+    if psql_path is not None:
+        cmd = [
+            psql_path, "-h", "127.0.0.1", "-p", port, "-U", user, "-d", "postgres",
+            "-w", "-tA", "-v", "ON_ERROR_STOP=1", "-c", sql,
+        ]
+    elif entry.get("version"):
+        cmd = [get_venv_python(entry["version"]), "-c", PSYCOPG_SCRIPT, port, user, sql]
+    else:
+        raise RuntimeError("no se encontró psql ni un entorno virtual con psycopg2")
+
+    try:
+        result = subprocess.run(
+            cmd, env=env, capture_output=True, text=True, timeout=SQL_TIMEOUT
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise RuntimeError(str(e))
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"código de salida {result.returncode}")
+    return result.stdout.strip()
+
+
+def _drop_database(entry):
+    close_pooled_database(entry["db_name"], server_port=entry["db_port"])
+    db_name = entry["db_name"].replace('"', '""')
+    try:
+        # WITH (FORCE) (PostgreSQL 13+) cierra las sesiones que sigan abiertas.
+        version = int(_run_sql(entry, "SHOW server_version_num") or 0)
+        force = " WITH (FORCE)" if version >= 130000 else ""
+        _run_sql(entry, f'DROP DATABASE IF EXISTS "{db_name}"{force};')
+    except (RuntimeError, ValueError) as e:
+        print(f"⚠️ DROP DATABASE de '{entry['db_name']}' falló: {e}")
+        _update_entry(entry, error=str(e))
+        return False
+    return True
+
+
+def _update_entry(entry, **changes):
+    entry.update(changes)
+    with config_lock:
+        config = load_config()
+        trash = config.setdefault("trash", [])
+        for item in trash:
+            if item["path"] == entry["path"]:
+                item.update(changes)
+        if entry.get("files_removed") and entry.get("db_dropped"):
+            config["trash"] = [item for item in trash if item["path"] != entry["path"]]
+        save_config(config)
+
+
+def reap_entry(entry):
+    """Completa el borrado de una entrada. Devuelve True si ya no queda nada pendiente."""
+    with _reap_lock:
+        return _reap_entry(entry)
+
+
+def _reap_entry(entry):
+    if not stop_instance({"name": entry["name"], "path": entry["original_path"]}):
+        print(f"⚠️ La instancia '{entry['name']}' sigue en ejecución, se reintentará.")
+        return False
+
+    if not entry.get("files_removed"):
+        path = entry["path"]
+        if os.path.exists(path):
+            print(f"Eliminando ficheros de '{entry['name']}' en segundo plano...")
+            with span("delete_instance.reap_files", instance=entry["name"]):
+                _remove_tree(path)
+        _update_entry(entry, files_removed=True)
+
+    if not entry.get("db_dropped"):
+        with span("delete_instance.drop_database", instance=entry["name"]):
+            dropped = _drop_database(entry)
+        if not dropped:
+            return False
+        _update_entry(entry, db_dropped=True)
+
+    print(f"Instancia '{entry['name']}' eliminada por completo.")
+    return True
+
+
+def _reaper_loop():
+    global _reaper_thread
+
+    _lower_io_priority()
+    while True:
+        with _reaper_lock:
+            pending = load_config().get("trash", [])
+            if not pending:
+                _reaper_thread = None
+                return
+        progressed = False
+        for entry in pending:
+            try:
+                progressed |= reap_entry(entry)
+            except Exception as e:
+                print(f"⚠️ Error limpiando '{entry.get('name')}': {e}")
+        if not progressed:
+            # Lo pendiente depende de algo externo (PostgreSQL parado,
+            # procesos vivos); se retomará en el próximo arranque.
+            break
+
+    with _reaper_lock:
+        _reaper_thread = None
+
+
+def schedule_reap():
+    """Arranca el hilo de limpieza si hay entradas pendientes y no está ya activo."""
+    global _reaper_thread
+
+    with _reaper_lock:
+        if _reaper_thread is not None:
+            return
+        if not load_config().get("trash"):
+            return
+        _reaper_thread = threading.Thread(
+            target=_reaper_loop, name="loocal-reaper", daemon=True
+        )
+        _reaper_thread.start()
+
+
+def retry_pending(name):
+    """
+    Reintenta ahora el borrado de las entradas de la papelera con ese nombre.
+    Devuelve los errores de las que siguen pendientes (lista vacía si ninguna).
+    """
+    errors = []
+    for entry in load_config().get("trash", []):
+        if entry["name"] != name:
+            continue
+        try:
+            done = reap_entry(entry)
+        except Exception as e:
+            done = False
+            entry["error"] = str(e)
+        if not done:
+            errors.append(entry.get("error") or "la instancia sigue en ejecución")
+    return errors
+
+
+def discard_database(name):
+    """
+    Renuncia a eliminar la base de datos de las entradas con ese nombre (queda
+    en el servidor) para liberar el nombre. Si quedan ficheros, la entrada
+    sigue en la papelera hasta que se borren (`schedule_reap`,
+    `retry_pending`). Devuelve los nombres de las bases de datos abandonadas.
+    """
+    abandoned = []
+    for entry in load_config().get("trash", []):
+        if entry["name"] == name and not entry.get("db_dropped"):
+            _update_entry(entry, db_dropped=True, db_abandoned=True)
+            abandoned.append(entry["db_name"])
+    return abandoned
+
+
+def format_trash(entries):
+    if not entries:
+        return "La papelera está vacía."
+    lines = []
+    for entry in entries:
+        pending = []
+        if not entry.get("files_removed"):
+            pending.append("ficheros")
+        if not entry.get("db_dropped"):
+            pending.append(f"base de datos '{entry['db_name']}' (puerto {entry['db_port']})")
+        deleted = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.get("deleted_at", 0)))
+        line = f"{entry['name']} (eliminada {deleted}): pendiente {', '.join(pending) or 'nada'}"
+        if entry.get("error"):
+            line += f"\n    último error: {entry['error']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def move_to_trash(instance, instances_dir):
+    """Renombra la carpeta de la instancia a la papelera y devuelve la entrada."""
+    trash_dir = os.path.join(instances_dir, TRASH_DIR_NAME)
+    os.makedirs(trash_dir, exist_ok=True)
+
+    original_path = instance["path"]
+    db_user, db_password = _db_credentials(os.path.join(original_path, "odoo.conf"))
+    target = os.path.join(
+        trash_dir, f"{instance['name']}-{time.strftime('%Y%m%d%H%M%S')}"
+    )
+    try:
+        os.rename(original_path, target)
+    except FileNotFoundError:
+        target = original_path
+    except OSError as e:
+        # En Windows no se puede renombrar con ficheros abiertos; el reaper
+        # borrará la carpeta en su sitio cuando los procesos terminen.
+        print(f"⚠️ No se pudo mover a la papelera ({e}), se borrará en su ubicación.")
+        target = original_path
+
+    return {
+        "name": instance["name"],
+        "path": target,
+        "original_path": original_path,
+        "db_name": instance["name"],
+        "db_port": instance.get("db_port", 5433),
+        "db_user": db_user,
+        "db_password": db_password,
+        "version": instance.get("version"),
+        "deleted_at": time.time(),
+        "files_removed": False,
+        "db_dropped": False,
+    }
@@ -0,0 +1,633 @@
+"""
+Proxy inverso local con enrutado por nombre de host.
+
+`http://<instancia>.localhost:8060/` se enruta al puerto Odoo de la instancia.
+Los recursos estáticos (`/<módulo>/static/...`) y los bundles de
+`/web/assets/...` se sirven desde una caché LRU en memoria, con validadores
+(ETag / Last-Modified) y variantes precomprimidas en gzip (y brotli si el
+módulo está instalado), de modo que los workers de Odoo solo atienden
+peticiones dinámicas.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+
+from .async_loop import run_coroutine
+from .utils import CONFIG_PATH, load_config
+
+# brotli es opcional: sin él solo se precomprime en gzip.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Fuera del rango 8069-8999 que get_free_port reparte entre las instancias.
+PROXY_PORT = 8060
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_MAX_ENTRY = 20 * 1024 * 1024
+STATIC_TTL = 60
+MIN_COMPRESS_SIZE = 1024
+BUFFER_SIZE = 64 * 1024
+
+STATIC_RE = re.compile(r"^/[^/?]+/static/")
+ASSETS_RE = re.compile(r"^/web/assets/")
+# Solo los bundles con hash en la URL son inmutables; "debug", "_" o "%" (modo
+# debug=assets y plantillas) cambian de contenido sin cambiar de URL.
+HASHED_ASSETS_RE = re.compile(r"^/web/assets/(?:\d+-)?[0-9a-f]{7,}/")
+BUS_PATHS = ("/websocket", "/longpolling")
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+    "font/ttf",
+    "font/otf",
+)
+HOP_BY_HOP = {
+    "connection",
+    "keep-alive",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+_proxy = None
+
+
+# === 📨 Utilidades HTTP ===
+class HttpHead:
+    """Línea inicial y cabeceras de una petición o respuesta HTTP/1.x."""
+
+    def __init__(self, start_line, headers):
+        self.start_line = start_line
+        self.headers = headers
+
+    @classmethod
+    async def read(cls, reader):
+        raw = await reader.readuntil(b"\r\n\r\n")
+        lines = raw.decode("latin-1").split("\r\n")
+        headers = []
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers.append((key.strip(), value.strip()))
+        return cls(lines[0], headers)
+
+    def get(self, name, default=None):
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return default
+
+    def without(self, *names):
+        names = {n.lower() for n in names}
+        return [(k, v) for k, v in self.headers if k.lower() not in names]
+
+    @property
+    def chunked(self):
+        return "chunked" in (self.get("Transfer-Encoding") or "").lower()
+
+    @property
+    def content_length(self):
+        value = self.get("Content-Length")
+        return int(value) if value is not None else None
+
+
+def build_head(start_line, headers):
+    lines = [start_line] + [f"{k}: {v}" for k, v in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def read_body(reader, head):
+    """Lee un cuerpo completo (Content-Length, chunked o hasta EOF)."""
+    if head.chunked:
+        parts = []
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0].strip(), 16)
+            if size == 0:
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                return b"".join(parts)
+            parts.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+    if head.content_length is not None:
+        return await reader.readexactly(head.content_length)
+    return await reader.read()
+
+
+async def relay_body(reader, writer, head):
+    """
+    Copia un cuerpo respetando su framing original.
+    Devuelve False si el cuerpo se delimitaba por cierre de conexión.
+    """
+    if head.chunked:
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            writer.write(line)
+            size = int(line.split(b";")[0].strip(), 16)
+            if size == 0:
+                while True:
+                    line = await reader.readuntil(b"\r\n")
+                    writer.write(line)
+                    if line == b"\r\n":
+                        break
+                await writer.drain()
+                return True
+            writer.write(await reader.readexactly(size + 2))
+            await writer.drain()
+
+    remaining = head.content_length
+    if remaining is not None:
+        while remaining > 0:
+            data = await reader.read(min(BUFFER_SIZE, remaining))
+            if not data:
+                raise ConnectionError("Cuerpo HTTP incompleto.")
+            writer.write(data)
+            await writer.drain()
+            remaining -= len(data)
+        return True
+
+    while True:
+        data = await reader.read(BUFFER_SIZE)
+        if not data:
+            return False
+        writer.write(data)
+        await writer.drain()
+
+
+def simple_response(status, body=b"", content_type="text/plain; charset=utf-8"):
+    return build_head(
+        f"HTTP/1.1 {status}",
+        [
+            ("Content-Type", content_type),
+            ("Content-Length", str(len(body))),
+            ("Connection", "close"),
+        ],
+    ) + body
+
+
+# === 🗃️ Caché LRU ===
+class CacheEntry:
+    def __init__(self, headers, body, immutable):
+        lower = {k.lower(): v for k, v in headers}
+        self.content_type = lower.get("content-type", "application/octet-stream")
+        self.etag = lower.get("etag") or '"%s"' % hashlib.sha1(body).hexdigest()
+        self.last_modified = lower.get("last-modified") or formatdate(usegmt=True)
+        self.cache_control = lower.get("cache-control") or (
+            "public, max-age=31536000, immutable" if immutable else "no-cache"
+        )
+        self.immutable = immutable
+        self.fetched_at = time.monotonic()
+        self.variants = {"identity": body}
+
+        if len(body) >= MIN_COMPRESS_SIZE and self.content_type.startswith(
+            COMPRESSIBLE_TYPES
+        ):
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body)
+
+    @property
+    def size(self):
+        return sum(len(v) for v in self.variants.values())
+
+    def fresh(self, ttl):
+        return self.immutable or time.monotonic() - self.fetched_at < ttl
+
+    def pick_variant(self, accept_encoding):
+        accepted = {
+            part.split(";")[0].strip().lower()
+            for part in (accept_encoding or "").split(",")
+        }
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.variants:
+                return encoding, self.variants[encoding]
+        return "identity", self.variants["identity"]
+
+
+class LRUCache:
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.discard(key)
+        if entry.size > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.used += entry.size
+        while self.used > self.max_bytes:
+            _, old = self.entries.popitem(last=False)
+            self.used -= old.size
+
+    def discard(self, key):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.used -= old.size
+
+    def clear(self, instance=None):
+        for key in [k for k in self.entries if instance in (None, k[0])]:
+            self.discard(key)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.used,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+        }
+
+
+# === 🔀 Proxy ===
+class ReverseProxy:
+    def __init__(self, port=PROXY_PORT, host="127.0.0.1", static_ttl=STATIC_TTL,
+                 cache_bytes=CACHE_MAX_BYTES):
+        self.port = port
+        self.host = host
+        self.static_ttl = static_ttl
+        self.cache = LRUCache(cache_bytes)
+        self._routes = {}
+        self._routes_mtime = None
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._on_client, self.host, self.port, limit=BUFFER_SIZE
+        )
+        print(f"Proxy inverso escuchando en http://*.localhost:{self.port}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def resolve(self, host_header, path="/"):
+        """
+        Devuelve (instancia, puerto) para `<nombre>.localhost[:puerto]`.
+        El bus (/websocket, /longpolling) va al puerto gevent si la instancia
+        se ejecuta con workers.
+        """
+        hostname = (host_header or "").split(":")[0].lower()
+        if not hostname.endswith(".localhost"):
+            return None, None
+
+        mtime = os.path.getmtime(CONFIG_PATH) if os.path.exists(CONFIG_PATH) else None
+        if mtime != self._routes_mtime:
+            self._routes = {
+                inst["name"].lower(): (inst.get("odoo_port", 8069), inst.get("gevent_port"))
+                for inst in load_config().get("instances", [])
+            }
+            self._routes_mtime = mtime
+
+        name = hostname[: -len(".localhost")]
+        http_port, gevent_port = self._routes.get(name, (None, None))
+        if gevent_port and path.startswith(BUS_PATHS):
+            return name, gevent_port
+        return name, http_port
+
+    async def _on_client(self, reader, writer):
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await HttpHead.read(reader)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                keep_alive = await self._handle(head, reader, writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, head, reader, writer):
+        method, target, version = (head.start_line.split(" ", 2) + ["", ""])[:3]
+        path = target.split("?", 1)[0]
+        name, port = self.resolve(head.get("Host"), path)
+        if port is None:
+            known = ", ".join(f"{n}.localhost" for n in sorted(self._routes)) or "ninguna"
+            writer.write(
+                simple_response(
+                    "404 Not Found",
+                    f"Instancia desconocida. Disponibles: {known}\n".encode(),
+                )
+            )
+            await writer.drain()
+            return False
+
+        client_keep_alive = version == "HTTP/1.1" and (
+            (head.get("Connection") or "").lower() != "close"
+        )
+
+        if head.get("Upgrade"):
+            await self._tunnel(head, reader, writer, port)
+            return False
+
+        if (
+            method in ("GET", "HEAD")
+            and not head.content_length
+            and not head.chunked
+            and (STATIC_RE.match(path) or ASSETS_RE.match(path))
+        ):
+            served = await self._serve_cached(head, method, target, name, port, writer)
+            return client_keep_alive and served
+
+        framed = await self._forward(head, reader, writer, port, client_keep_alive)
+        return client_keep_alive and framed
+
+    def _upstream_headers(self, head, writer):
+        peer = writer.get_extra_info("peername")
+        headers = head.without(
+            *HOP_BY_HOP, "Expect", "X-Forwarded-For", "X-Forwarded-Host",
+            "X-Forwarded-Proto",
+        )
+        headers += [
+            ("X-Forwarded-For", peer[0] if peer else "127.0.0.1"),
+            ("X-Forwarded-Host", head.get("Host", "")),
+            ("X-Forwarded-Proto", "http"),
+        ]
+        return headers
+
+    async def _forward(self, head, reader, writer, port, client_keep_alive):
+        """Reenvía una petición dinámica. Devuelve False si hay que cerrar al cliente."""
+        try:
+            up_reader, up_writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError as e:
+            await self._bad_gateway(writer, port, e)
+            return False
+        try:
+            try:
+                headers = self._upstream_headers(head, writer) + [("Connection", "close")]
+                if head.chunked:
+                    headers.append(("Transfer-Encoding", "chunked"))
+                up_writer.write(build_head(head.start_line, headers))
+                if head.chunked or head.content_length:
+                    await relay_body(reader, up_writer, head)
+                await up_writer.drain()
+                resp = await HttpHead.read(up_reader)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                await self._bad_gateway(writer, port, e)
+                return False
+
+            status = int(resp.start_line.split(" ", 2)[1])
+            has_body = (
+                not head.start_line.startswith("HEAD ")
+                and status >= 200
+                and status not in (204, 304)
+            )
+            framed = not has_body or resp.chunked or resp.content_length is not None
+
+            resp_headers = resp.without(*HOP_BY_HOP)
+            if resp.chunked and has_body:
+                resp_headers.append(("Transfer-Encoding", "chunked"))
+            keep = client_keep_alive and framed
+            resp_headers.append(("Connection", "keep-alive" if keep else "close"))
+            writer.write(build_head(resp.start_line, resp_headers))
+
+            if has_body:
+                await relay_body(up_reader, writer, resp)
+            await writer.drain()
+            return framed
+        finally:
+            up_writer.close()
+
+    async def _tunnel(self, head, reader, writer, port):
+        """Túnel bidireccional para websockets (bus de Odoo 16+)."""
+        try:
+            up_reader, up_writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError as e:
+            await self._bad_gateway(writer, port, e)
+            return
+        headers = head.without("X-Forwarded-For", "X-Forwarded-Host", "X-Forwarded-Proto")
+        peer = writer.get_extra_info("peername")
+        headers += [
+            ("X-Forwarded-For", peer[0] if peer else "127.0.0.1"),
+            ("X-Forwarded-Host", head.get("Host", "")),
+            ("X-Forwarded-Proto", "http"),
+        ]
+        up_writer.write(build_head(head.start_line, headers))
+
+        async def pipe(src, dst):
+            try:
+                while True:
+                    data = await src.read(BUFFER_SIZE)
+                    if not data:
+                        break
+                    dst.write(data)
+                    await dst.drain()
+            except ConnectionError:
+                pass
+            finally:
+                dst.close()
+
+        await asyncio.gather(pipe(reader, up_writer), pipe(up_reader, writer))
+
+    async def _bad_gateway(self, writer, port, error):
+        writer.write(
+            simple_response(
+                "502 Bad Gateway",
+                f"La instancia no responde en el puerto {port} ({error}).\n".encode(),
+            )
+        )
+        await writer.drain()
+
+    # === 🗃️ Estáticos con caché ===
+    async def _serve_cached(self, head, method, target, name, port, writer):
+        """Sirve un estático desde la caché. Devuelve False si hay que cerrar al cliente."""
+        key = (name, target)
+        entry = self.cache.get(key)
+
+        cache_status = "HIT"
+        try:
+            if entry is not None and entry.fresh(self.static_ttl):
+                self.cache.hits += 1
+            elif entry is not None:
+                cache_status = "REVALIDATED"
+                self.cache.revalidations += 1
+                entry = await self._revalidate(head, target, port, key, entry, writer)
+                if entry is None:
+                    return True
+            else:
+                cache_status = "MISS"
+                self.cache.misses += 1
+                entry = await self._fetch(head, target, port, key, writer)
+                if entry is None:
+                    return True
+        except (OSError, asyncio.IncompleteReadError) as e:
+            await self._bad_gateway(writer, port, e)
+            return False
+
+        if (
+            head.get("If-None-Match") == entry.etag
+            or (not head.get("If-None-Match")
+                and head.get("If-Modified-Since") == entry.last_modified)
+        ):
+            writer.write(
+                build_head(
+                    "HTTP/1.1 304 Not Modified",
+                    [
+                        ("ETag", entry.etag),
+                        ("Last-Modified", entry.last_modified),
+                        ("Cache-Control", entry.cache_control),
+                        ("Vary", "Accept-Encoding"),
+                    ],
+                )
+            )
+            await writer.drain()
+            return True
+
+        encoding, body = entry.pick_variant(head.get("Accept-Encoding"))
+        headers = [
+            ("Content-Type", entry.content_type),
+            ("Content-Length", str(len(body))),
+            ("ETag", entry.etag),
+            ("Last-Modified", entry.last_modified),
+            ("Cache-Control", entry.cache_control),
+            ("Vary", "Accept-Encoding"),
+            ("X-Cache", cache_status),
+        ]
+        if encoding != "identity":
+            headers.append(("Content-Encoding", encoding))
+        writer.write(build_head("HTTP/1.1 200 OK", headers))
+        if method != "HEAD":
+            writer.write(body)
+        await writer.drain()
+        return True
+
+    async def _build_entry(self, resp, body, target):
+        # La precompresión puede tardar con bundles grandes: fuera del bucle.
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, CacheEntry, resp.headers, body, bool(HASHED_ASSETS_RE.match(target))
+        )
+
+    async def _upstream_get(self, head, target, port, extra_headers=()):
+        up_reader, up_writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            headers = head.without(
+                *HOP_BY_HOP, "Accept-Encoding", "If-None-Match",
+                "If-Modified-Since", "Range", "If-Range",
+            )
+            headers += [
+                ("X-Forwarded-Host", head.get("Host", "")),
+                ("X-Forwarded-Proto", "http"),
+                ("Accept-Encoding", "identity"),
+                ("Connection", "close"),
+            ]
+            headers += list(extra_headers)
+            up_writer.write(build_head(f"GET {target} HTTP/1.1", headers))
+            await up_writer.drain()
+
+            resp = await HttpHead.read(up_reader)
+            status = int(resp.start_line.split(" ", 2)[1])
+            body = b"" if status == 304 else await read_body(up_reader, resp)
+            return resp, status, body
+        finally:
+            up_writer.close()
+
+    async def _fetch(self, head, target, port, key, writer):
+        resp, status, body = await self._upstream_get(head, target, port)
+        cache_control = (resp.get("Cache-Control") or "").lower()
+        if (
+            status == 200
+            and "no-store" not in cache_control
+            and not resp.get("Content-Encoding")
+            and len(body) <= CACHE_MAX_ENTRY
+        ):
+            entry = await self._build_entry(resp, body, target)
+            self.cache.put(key, entry)
+            return entry
+
+        # No cacheable: se devuelve tal cual.
+        headers = resp.without(*HOP_BY_HOP, "Content-Length")
+        headers += [("Content-Length", str(len(body))), ("X-Cache", "MISS")]
+        writer.write(build_head(resp.start_line, headers) + body)
+        await writer.drain()
+        return None
+
+    async def _revalidate(self, head, target, port, key, entry, writer):
+        resp, status, body = await self._upstream_get(
+            head,
+            target,
+            port,
+            [("If-None-Match", entry.etag), ("If-Modified-Since", entry.last_modified)],
+        )
+        if status == 304:
+            entry.fetched_at = time.monotonic()
+            return entry
+        self.cache.discard(key)
+        if status == 200 and len(body) <= CACHE_MAX_ENTRY and not resp.get("Content-Encoding"):
+            entry = await self._build_entry(resp, body, target)
+            self.cache.put(key, entry)
+            return entry
+
+        headers = resp.without(*HOP_BY_HOP, "Content-Length")
+        headers += [("Content-Length", str(len(body))), ("X-Cache", "MISS")]
+        writer.write(build_head(resp.start_line, headers) + body)
+        await writer.drain()
+        return None
+
+
+# === ⚙️ API síncrona para el gestor ===
+def ensure_reverse_proxy(port=PROXY_PORT, **kwargs):
+    """Inicia el proxy inverso en el bucle de fondo si aún no está en marcha."""
+    global _proxy
+
+    if _proxy is not None:
+        return _proxy
+
+    proxy = ReverseProxy(port=port, **kwargs)
+    run_coroutine(proxy.start(), timeout=10)
+    _proxy = proxy
+    return _proxy
+
+
+def stop_reverse_proxy():
+    global _proxy
+
+    if _proxy is None:
+        return
+    run_coroutine(_proxy.stop(), timeout=10)
+    _proxy = None
+
+
+def is_reverse_proxy_running():
+    return _proxy is not None
+
+
+def instance_url(name, port=PROXY_PORT):
+    return f"http://{name.lower()}.localhost:{port}/"
+
+
+def get_proxy_stats():
+    return _proxy.cache.stats() if _proxy is not None else {}
+
+
+def clear_proxy_cache(instance=None):
+    """Vacía la caché de estáticos (de una instancia o completa)."""
+    if _proxy is not None:
+        run_coroutine(_clear(_proxy, instance.lower() if instance else None), timeout=5)
+
+
+async def _clear(proxy, instance):
+    proxy.cache.clear(instance)
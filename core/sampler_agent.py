@@ -0,0 +1,160 @@
+"""
+Muestreador de pilas que se ejecuta dentro de Odoo (modo "profile").
+
+Este fichero no depende del resto de `core`: `install_profiler` lo copia como
+`loocal_sampler.py` al site-packages del entorno virtual de la versión, y el
+`loocal_sampler.pth` instalado junto a él llama a `bootstrap()` solo si la
+variable de entorno LOOCAL_PROFILE_DIR está definida. Sin esa variable no se
+importa nada más; con ella, el hilo muestreador duerme mientras el muestreo
+está apagado.
+
+Cada proceso (el principal y cada worker de prefork) acumula pilas en memoria
+y las vuelca en `<dir>/profile-<pid>.collapsed` en formato "collapsed"
+(`marco;marco;marco N`), listo para flamegraph.pl o speedscope. Es un
+muestreo de tiempo de pared: también cuenta los hilos bloqueados en E/S.
+
+El muestreo está activo mientras exista `<dir>/.sampling`. El gestor crea o
+borra ese fichero y envía SIGUSR2 para que los procesos lo relean al momento;
+en Windows, o si Odoo sustituye el manejador, se relee cada pocos segundos.
+"""
+
+import atexit
+import os
+import signal
+import sys
+import threading
+import time
+
+PROFILE_ENV = "LOOCAL_PROFILE_DIR"
+INTERVAL_ENV = "LOOCAL_PROFILE_INTERVAL"
+CONTROL_FILENAME = ".sampling"
+TOGGLE_SIGNAL = getattr(signal, "SIGUSR2", None)
+DEFAULT_INTERVAL = 0.01
+CONTROL_POLL = 2.0
+FLUSH_INTERVAL = 5.0
+MAX_DEPTH = 128
+
+_state = None
+
+
+class _Sampler:
+    def __init__(self, profile_dir, interval):
+        self.profile_dir = profile_dir
+        self.interval = interval
+        self.control_path = os.path.join(profile_dir, CONTROL_FILENAME)
+        self.enabled = False
+        self.wake = threading.Event()
+        self.counts = {}
+        self.dirty = False
+        self.labels = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        self.enabled = os.path.exists(self.control_path)
+        self.thread = threading.Thread(
+            target=self._run, name="loocal-sampler", daemon=True
+        )
+        self.thread.start()
+
+    def refresh(self):
+        """Relee el fichero de control y despierta al hilo."""
+        self.enabled = os.path.exists(self.control_path)
+        self.wake.set()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            if not self.enabled:
+                # Apagado: sin muestreo, solo una comprobación del fichero de
+                # control cada CONTROL_POLL segundos (o al recibir la señal).
+                self.flush()
+                self.wake.wait(CONTROL_POLL)
+                self.wake.clear()
+                self.enabled = os.path.exists(self.control_path)
+                continue
+
+            self._sample()
+            now = time.monotonic()
+            if now - last_flush >= FLUSH_INTERVAL:
+                self.flush()
+                self.enabled = os.path.exists(self.control_path)
+                last_flush = now
+            time.sleep(self.interval)
+
+    def _label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = (
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+        return label
+
+    def _sample(self):
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            with self.lock:
+                self.counts[key] = self.counts.get(key, 0) + 1
+                self.dirty = True
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            lines = [f"{stack} {count}\n" for stack, count in self.counts.items()]
+        path = os.path.join(self.profile_dir, f"profile-{os.getpid()}.collapsed")
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def after_fork(self):
+        """En el hijo (worker) solo sobrevive el hilo que hizo fork: se relanza."""
+        self.counts = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.start()
+
+
+def _on_signal(signum, frame):
+    if _state is not None:
+        _state.refresh()
+
+
+def install():
+    """Arranca el muestreador en este proceso (idempotente)."""
+    global _state
+
+    profile_dir = os.environ.get(PROFILE_ENV)
+    if not profile_dir or _state is not None:
+        return
+    os.makedirs(profile_dir, exist_ok=True)
+    interval = float(os.environ.get(INTERVAL_ENV) or DEFAULT_INTERVAL)
+
+    _state = _Sampler(profile_dir, interval)
+    _state.start()
+    atexit.register(_state.flush)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_state.after_fork)
+    if TOGGLE_SIGNAL is not None and threading.current_thread() is threading.main_thread():
+        signal.signal(TOGGLE_SIGNAL, _on_signal)
+
+
+def bootstrap():
+    """Punto de entrada del .pth: un fallo aquí no debe impedir arrancar Odoo."""
+    try:
+        install()
+    except Exception as e:
+        print(f"loocal_sampler: no se pudo iniciar ({e})", file=sys.stderr)
@@ -0,0 +1,286 @@
+"""
+Planificador de arranques con control de admisión por recursos.
+
+Cada arranque se admite solo si la RAM disponible del equipo (descontando lo
+reservado para los arranques en curso) cubre la huella estimada de la
+instancia y la CPU no está saturada; el resto queda en cola hasta que haya
+margen. La huella se estima a partir de las métricas registradas en
+ejecuciones anteriores (`instances/<nombre>/metrics.json`).
+
+Antes de lanzar cada instancia se recalculan `workers`, `limit_memory_soft`,
+`limit_memory_hard`, `max_cron_threads` y `db_maxconn` en su odoo.conf según
+cuántas instancias comparten el equipo en ese momento. El modo prefork solo
+se usa si la instancia se sirve a través del proxy inverso: con workers el bus
+(/websocket, /longpolling) escucha en `gevent_port`, y solo el proxy lo enruta
+allí.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import psutil
+
+from .odoo_manager import run_instance, update_odoo_conf
+from .reverse_proxy import is_reverse_proxy_running
+from .utils import config_lock, get_free_port, load_config, save_config
+
+MB = 1024 * 1024
+DEFAULT_FOOTPRINT_MB = 700
+FOOTPRINT_MARGIN = 1.2
+RESERVED_RAM_MB = 1024
+MAX_CPU_PERCENT = 85
+STARTUP_GRACE = 60
+MAX_DB_CONNECTIONS = 100
+RESERVED_DB_CONNECTIONS = 10
+MAX_WORKERS = 4
+MAX_CRON_THREADS = 2
+
+_scheduler = None
+
+
+# === 📈 Métricas por instancia ===
+def _metrics_path(instance):
+    return os.path.join(instance["path"], "metrics.json")
+
+
+def load_metrics(instance):
+    try:
+        with open(_metrics_path(instance)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_sample(instance, rss_mb, cpu_percent):
+    """Acumula una muestra de memoria y CPU (pico y media móvil)."""
+    metrics = load_metrics(instance)
+    samples = metrics.get("samples", 0)
+    alpha = 0.1 if samples else 1.0
+    metrics["rss_peak_mb"] = max(metrics.get("rss_peak_mb", 0), round(rss_mb, 1))
+    metrics["rss_avg_mb"] = round(
+        (1 - alpha) * metrics.get("rss_avg_mb", rss_mb) + alpha * rss_mb, 1
+    )
+    metrics["cpu_avg"] = round(
+        (1 - alpha) * metrics.get("cpu_avg", cpu_percent) + alpha * cpu_percent, 1
+    )
+    metrics["samples"] = samples + 1
+    metrics["updated"] = time.time()
+    with open(_metrics_path(instance), "w") as f:
+        json.dump(metrics, f, indent=4)
+
+
+def estimate_footprint_mb(instance):
+    """Huella estimada: pico observado con margen, o un valor por defecto."""
+    peak = load_metrics(instance).get("rss_peak_mb")
+    if not peak:
+        return DEFAULT_FOOTPRINT_MB
+    return peak * FOOTPRINT_MARGIN
+
+
+# === 🧮 Límites por instancia ===
+def compute_instance_limits(co_scheduled, footprint_mb=DEFAULT_FOOTPRINT_MB, prefork=True):
+    """
+    Reparte CPU, RAM y conexiones de PostgreSQL entre `co_scheduled` instancias.
+    Con menos de 3 núcleos por instancia, o con `prefork=False`, se usa el modo
+    multihilo (workers = 0), que es el que menos memoria consume.
+
+    Odoo aplica `db_maxconn` a cada proceso: en modo prefork cada worker HTTP,
+    cada worker de cron y el proceso gevent tienen su propio pool, así que la
+    parte de la instancia se divide entre todos ellos.
+    """
+    co_scheduled = max(1, co_scheduled)
+    cpus = psutil.cpu_count() or 1
+    total_mb = psutil.virtual_memory().total / MB
+
+    cpus_each = cpus / co_scheduled
+    workers = min(MAX_WORKERS, int(cpus_each) - 1) if prefork and cpus_each >= 3 else 0
+
+    budget_mb = max(footprint_mb, (total_mb - RESERVED_RAM_MB) * 0.75 / co_scheduled)
+    hard_mb = max(512, budget_mb / (workers + 1))
+    soft_mb = hard_mb * 0.8
+
+    db_share = (MAX_DB_CONNECTIONS - RESERVED_DB_CONNECTIONS) // co_scheduled
+    processes = workers + MAX_CRON_THREADS + 1 if workers > 0 else 1
+    db_maxconn = max(2, min(64, db_share // processes))
+
+    return {
+        "workers": workers,
+        "max_cron_threads": MAX_CRON_THREADS,
+        "limit_memory_soft": int(soft_mb * MB),
+        "limit_memory_hard": int(hard_mb * MB),
+        "db_maxconn": db_maxconn,
+    }
+
+
+def _gevent_option(version):
+    try:
+        return "gevent_port" if float(version) >= 16 else "longpolling_port"
+    except ValueError:
+        return "gevent_port"
+
+
+def apply_instance_limits(instance, limits):
+    """Escribe los límites en el odoo.conf y asigna puerto de longpolling si hay workers."""
+    values = dict(limits)
+    if limits["workers"] > 0:
+        gevent_port = instance.get("gevent_port") or get_free_port(9100, 9499)
+        values[_gevent_option(instance["version"])] = gevent_port
+        if instance.get("gevent_port") != gevent_port:
+            instance["gevent_port"] = gevent_port
+            with config_lock:
+                config = load_config()
+                for inst in config["instances"]:
+                    if inst["name"] == instance["name"]:
+                        inst["gevent_port"] = gevent_port
+                save_config(config)
+    update_odoo_conf(os.path.join(instance["path"], "odoo.conf"), values)
+
+
+# === 🚦 Planificador ===
+class AdmissionScheduler:
+    def __init__(self, launcher=run_instance, poll_interval=2, sample_interval=10):
+        self.launcher = launcher
+        self.poll_interval = poll_interval
+        self.sample_interval = sample_interval
+        self.queue = deque()
+        self.launch_options = {}
+        self.starting = {}
+        self.running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_sample = 0
+        # CPU global medida una vez por vuelta del bucle (ventana de
+        # poll_interval); medirla por cada instancia de la cola daría ~0.
+        self.cpu_percent = 0.0
+        self._thread = threading.Thread(
+            target=self._loop, name="loocal-scheduler", daemon=True
+        )
+        psutil.cpu_percent(interval=None)
+        self._thread.start()
+
+    def request_start(self, instance, on_launch=None, **launch_kwargs):
+        """
+        Arranca la instancia si hay recursos; si no, la encola. Devuelve True si
+        arrancó. `launch_kwargs` se pasan al lanzador (`mode`, `http_port`) y
+        `on_launch(process, error)` se llama al lanzarla o al fallar.
+        """
+        with self._lock:
+            self.launch_options[instance["name"]] = dict(launch_kwargs, on_launch=on_launch)
+            if any(inst["name"] == instance["name"] for inst in self.queue):
+                return False
+            self.queue.append(instance)
+            started = self._admit()
+        return instance["name"] in started
+
+    def cancel(self, name):
+        with self._lock:
+            self.queue = deque(i for i in self.queue if i["name"] != name)
+            options = self.launch_options.pop(name, {})
+        if options.get("on_launch"):
+            options["on_launch"](None, RuntimeError(f"Arranque de '{name}' cancelado."))
+
+    def queued(self):
+        with self._lock:
+            return [inst["name"] for inst in self.queue]
+
+    def stop(self):
+        self._stop.set()
+
+    def _available_mb(self):
+        now = time.monotonic()
+        self.starting = {
+            name: (est, t0)
+            for name, (est, t0) in self.starting.items()
+            if now - t0 < STARTUP_GRACE
+        }
+        reserved = sum(est for est, _ in self.starting.values())
+        return psutil.virtual_memory().available / MB - RESERVED_RAM_MB - reserved
+
+    def _admit(self):
+        """Lanza instancias de la cola mientras haya margen (orden FIFO)."""
+        started = []
+        while self.queue:
+            instance = self.queue[0]
+            footprint = estimate_footprint_mb(instance)
+            if footprint > self._available_mb() or self.cpu_percent > MAX_CPU_PERCENT:
+                break
+
+            self.queue.popleft()
+            co_scheduled = len(self.running | set(self.starting)) + 1
+            options = self.launch_options.pop(instance["name"], {})
+            on_launch = options.pop("on_launch", None)
+            # La activación bajo demanda (http_port) reenvía todo a un único
+            # puerto, igual que el acceso directo sin proxy: el bus solo
+            # funciona en modo multihilo.
+            prefork = "http_port" not in options and is_reverse_proxy_running()
+            limits = compute_instance_limits(co_scheduled, footprint, prefork=prefork)
+            try:
+                apply_instance_limits(instance, limits)
+                print(
+                    f"Admitiendo {instance['name']} (~{footprint:.0f} MB, "
+                    f"{limits['workers']} workers, db_maxconn {limits['db_maxconn']})"
+                )
+                process = self.launcher(instance, **options)
+            except Exception as e:
+                print(f"⚠️ No se pudo iniciar {instance['name']}: {e}")
+                if on_launch:
+                    on_launch(None, e)
+                continue
+            if on_launch:
+                on_launch(process, None)
+            self.starting[instance["name"]] = (footprint, time.monotonic())
+            started.append(instance["name"])
+        return started
+
+    def _sample(self):
+        """Una pasada por los procesos: actualiza métricas e instancias en marcha."""
+        instances = {
+            os.path.abspath(os.path.join(inst["path"], "odoo.conf")): inst
+            for inst in load_config().get("instances", [])
+        }
+        usage = {}
+        for proc in psutil.process_iter(["cmdline", "memory_info"]):
+            cmdline = proc.info.get("cmdline") or []
+            for arg in cmdline:
+                if arg.endswith("odoo.conf") and os.path.abspath(arg) in instances:
+                    inst = instances[os.path.abspath(arg)]
+                    rss, cpu = usage.get(inst["name"], (0, 0))
+                    try:
+                        cpu += proc.cpu_percent(interval=None)
+                    except psutil.Error:
+                        pass
+                    mem = proc.info.get("memory_info")
+                    usage[inst["name"]] = (rss + (mem.rss if mem else 0), cpu)
+                    break
+
+        by_name = {inst["name"]: inst for inst in instances.values()}
+        for name, (rss, cpu) in usage.items():
+            try:
+                record_sample(by_name[name], rss / MB, cpu)
+            except OSError:
+                pass
+        self.running = set(usage)
+
+    def _loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.cpu_percent = psutil.cpu_percent(interval=None)
+                if time.monotonic() - self._last_sample >= self.sample_interval:
+                    self._last_sample = time.monotonic()
+                    self._sample()
+                with self._lock:
+                    if self.queue:
+                        self._admit()
+            except Exception as e:
+                print(f"⚠️ Error en el planificador: {e}")
+
+
+def get_scheduler():
+    global _scheduler
+
+    if _scheduler is None:
+        _scheduler = AdmissionScheduler()
+    return _scheduler
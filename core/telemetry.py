@@ -0,0 +1,246 @@
+"""
+Instrumentación de tiempos (spans) para aprovisionamiento y ciclo de vida.
+
+Cada span se añade como una línea JSON a `core/telemetry.jsonl` (historial
+solo de anexado). Sobre ese historial se calculan percentiles por paso, que se
+pueden consultar con `python cli.py stats` o exponer en formato de texto de
+Prometheus en http://127.0.0.1:9464/metrics.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), "telemetry.jsonl")
+METRICS_PORT = 9464
+QUANTILES = (0.5, 0.9, 0.99)
+
+_write_lock = threading.Lock()
+_local = threading.local()
+_metrics_server = None
+_metrics_lock = threading.Lock()
+# Estado del endpoint: spans leídos hasta `offset` y la última respuesta,
+# válida mientras el historial no cambie (mismo inode, tamaño y mtime).
+_metrics_cache = {"inode": None, "offset": 0, "spans": [], "stamp": None, "body": b""}
+
+
+# === ⏱️ Registro de spans ===
+def record(name, duration, ok=True, start=None, parent=None, **attrs):
+    """Añade un span ya medido al historial."""
+    entry = {
+        "name": name,
+        "start": round(start if start is not None else time.time() - duration, 3),
+        "duration": round(duration, 4),
+        "ok": ok,
+        "pid": os.getpid(),
+    }
+    if parent:
+        entry["parent"] = parent
+    if attrs:
+        entry["attrs"] = attrs
+    line = json.dumps(entry, ensure_ascii=False)
+    with _write_lock:
+        with open(HISTORY_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def span(name, **attrs):
+    """Mide el bloque y lo registra; los spans anidados guardan el nombre del padre."""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+    stack.append(name)
+
+    start = time.time()
+    started = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        stack.pop()
+        try:
+            record(name, time.perf_counter() - started, ok, start, parent, **attrs)
+        except OSError:
+            pass
+
+
+def timed(name):
+    """Decorador equivalente a envolver la función en `span(name)`."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# === 📊 Consulta y agregados ===
+def load_spans(since=None, prefix=None):
+    """Lee el historial, opcionalmente desde un instante (epoch) y por prefijo."""
+    spans = []
+    if not os.path.exists(HISTORY_PATH):
+        return spans
+    with open(HISTORY_PATH, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if since is not None and entry["start"] < since:
+                continue
+            if prefix and not entry["name"].startswith(prefix):
+                continue
+            spans.append(entry)
+    return spans
+
+
+def percentile(sorted_values, q):
+    """Percentil con interpolación lineal sobre una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+
+def summarize(spans):
+    durations = {}
+    errors = {}
+    for entry in spans:
+        durations.setdefault(entry["name"], []).append(entry["duration"])
+        if not entry.get("ok", True):
+            errors[entry["name"]] = errors.get(entry["name"], 0) + 1
+
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "sum": sum(values),
+            "max": values[-1],
+            "errors": errors.get(name, 0),
+            "quantiles": {q: percentile(values, q) for q in QUANTILES},
+        }
+    return summary
+
+
+def format_stats(summary):
+    if not summary:
+        return "No hay datos de tiempos registrados."
+    header = f"{'span':<40} {'n':>5} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'err':>4}"
+    lines = [header, "-" * len(header)]
+    for name in sorted(summary):
+        s = summary[name]
+        q = s["quantiles"]
+        lines.append(
+            f"{name:<40} {s['count']:>5} {q[0.5]:>8.2f}s {q[0.9]:>8.2f}s "
+            f"{q[0.99]:>8.2f}s {s['max']:>8.2f}s {s['errors']:>4}"
+        )
+    return "\n".join(lines)
+
+
+def render_prometheus(summary):
+    lines = [
+        "# HELP loocal_span_duration_seconds Duración de los pasos de aprovisionamiento y ciclo de vida.",
+        "# TYPE loocal_span_duration_seconds summary",
+    ]
+    for name in sorted(summary):
+        s = summary[name]
+        for q, value in s["quantiles"].items():
+            lines.append(
+                f'loocal_span_duration_seconds{{span="{name}",quantile="{q}"}} {value:.6f}'
+            )
+        lines.append(f'loocal_span_duration_seconds_sum{{span="{name}"}} {s["sum"]:.6f}')
+        lines.append(f'loocal_span_duration_seconds_count{{span="{name}"}} {s["count"]}')
+    lines.append("# HELP loocal_span_errors_total Spans terminados con excepción.")
+    lines.append("# TYPE loocal_span_errors_total counter")
+    for name in sorted(summary):
+        lines.append(f'loocal_span_errors_total{{span="{name}"}} {summary[name]["errors"]}')
+    return "\n".join(lines) + "\n"
+
+
+# === 🌐 Endpoint Prometheus ===
+def _metrics_body():
+    """
+    Respuesta de /metrics. Cada scrape solo lee lo añadido al historial desde
+    el anterior, y si no ha cambiado nada devuelve la respuesta ya calculada.
+    """
+    try:
+        st = os.stat(HISTORY_PATH)
+        stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+    except FileNotFoundError:
+        st = stamp = None
+
+    with _metrics_lock:
+        cache = _metrics_cache
+        if stamp is not None and stamp == cache["stamp"]:
+            return cache["body"]
+        if st is None or st.st_ino != cache["inode"] or st.st_size < cache["offset"]:
+            # Historial nuevo, sustituido o truncado: se empieza de cero.
+            cache.update(inode=st and st.st_ino, offset=0, spans=[])
+        if st is not None:
+            with open(HISTORY_PATH, "rb") as f:
+                f.seek(cache["offset"])
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Línea a medio escribir: se leerá en el próximo scrape.
+                    cache["offset"] += len(line)
+                    try:
+                        cache["spans"].append(json.loads(line))
+                    except ValueError:
+                        continue
+        cache["body"] = render_prometheus(summarize(cache["spans"])).encode()
+        cache["stamp"] = stamp
+        return cache["body"]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = _metrics_body()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=METRICS_PORT, host="127.0.0.1"):
+    """Sirve /metrics en un hilo daemon. Devuelve el servidor (idempotente)."""
+    global _metrics_server
+
+    if _metrics_server is None:
+        _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(
+            target=_metrics_server.serve_forever, name="loocal-metrics", daemon=True
+        ).start()
+        print(f"Métricas Prometheus en http://{host}:{port}/metrics")
+    return _metrics_server
+
+
+def stop_metrics_server():
+    global _metrics_server
+
+    if _metrics_server is not None:
+        _metrics_server.shutdown()
+        _metrics_server.server_close()
+        _metrics_server = None
@@ -3,9 +3,16 @@ import json
 import random
 import psutil
 import socket
+import threading
+import time
 
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
 
+# Los hilos en segundo plano (reaper, planificador) y la GUI hacen
+# leer → modificar → guardar sobre el mismo config.json: ese ciclo completo
+# se hace con este lock tomado.
+config_lock = threading.RLock()
+
 
 def get_free_port(start=8069, end=8999):
     """Encuentra un puerto libre entre start y end."""
@@ -16,16 +23,39 @@ def get_free_port(start=8069, end=8999):
     raise RuntimeError("No hay puertos disponibles en el rango especificado.")
 
 
+def wait_for_port(port, timeout=300, host="127.0.0.1", interval=0.5, alive=None):
+    """Espera a que el puerto acepte conexiones. `alive()` permite abortar si el proceso muere."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            if s.connect_ex((host, port)) == 0:
+                return True
+        if alive is not None and not alive():
+            return False
+        time.sleep(interval)
+    return False
+
+
 def load_config():
-    if not os.path.exists(CONFIG_PATH):
-        save_config({"instances": []})
+    with config_lock:
+        if not os.path.exists(CONFIG_PATH):
+            save_config({"instances": []})
     with open(CONFIG_PATH, "r") as f:
         return json.load(f)
 
 
 def save_config(data):
-    with open(CONFIG_PATH, "w") as f:
-        json.dump(data, f, indent=4)
+    # Se escribe en un temporal y se sustituye de golpe: quien lea a la vez
+    # ve el fichero anterior o el nuevo, nunca uno a medio escribir.
+    tmp_path = f"{CONFIG_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, CONFIG_PATH)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 
 def ensure_dirs(base_dir):
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import subprocess
+import time
+
+STAMP_FILE = ".loocal_warmup"
+# Ficheros que el propio gestor deja en el site-packages (el muestreador de
+# core/profiler.py): no son dependencias y no deben invalidar el sello.
+FINGERPRINT_IGNORE = ("loocal_sampler",)
+
+
+def venv_info(python_exec):
+    """Devuelve (cache_tag, site-packages) del intérprete del entorno virtual."""
+    output = subprocess.check_output(
+        [
+            python_exec,
+            "-c",
+            "import sys, sysconfig; "
+            "print(sys.implementation.cache_tag); "
+            "print(sysconfig.get_paths()['purelib'])",
+        ],
+        text=True,
+    )
+    cache_tag, purelib = output.strip().splitlines()
+    return cache_tag, purelib
+
+
+def _fingerprint(version_path, cache_tag, purelib):
+    """
+    Sello de lo precompilado: intérprete, requirements.txt y paquetes
+    instalados. Si pip instala o actualiza algo, el sello deja de coincidir.
+    """
+    digest = hashlib.sha256(cache_tag.encode())
+    requirements = os.path.join(version_path, "requirements.txt")
+    if os.path.exists(requirements):
+        with open(requirements, "rb") as f:
+            digest.update(f.read())
+    if os.path.isdir(purelib):
+        installed = (
+            name for name in os.listdir(purelib) if not name.startswith(FINGERPRINT_IGNORE)
+        )
+        digest.update("\n".join(sorted(installed)).encode())
+    return f"{cache_tag} {digest.hexdigest()}"
+
+
+def warmup_version(version_path, python_exec, force=False):
+    """
+    Precompila a bytecode el código de Odoo, sus addons y el site-packages del
+    entorno virtual, en paralelo y con pycs "checked-hash".
+
+    Los pycs basados en hash siguen siendo válidos aunque cambien las fechas de
+    modificación (copias, worktrees, checkouts), así que las instancias que
+    comparten versión ya no compiten por escribir en `__pycache__` al arrancar.
+    Se guarda un sello (intérprete + dependencias) para no repetir el trabajo.
+    """
+    stamp_path = os.path.join(version_path, STAMP_FILE)
+    cache_tag, purelib = venv_info(python_exec)
+    stamp = _fingerprint(version_path, cache_tag, purelib)
+
+    if not force and os.path.exists(stamp_path):
+        with open(stamp_path) as f:
+            if f.read().strip() == stamp:
+                print(f"Bytecode ya precompilado para {cache_tag}, omitiendo.")
+                return
+
+    targets = [
+        path
+        for path in (
+            os.path.join(version_path, "odoo"),
+            os.path.join(version_path, "addons"),
+            purelib,
+        )
+        if os.path.isdir(path)
+    ]
+
+    print(f"Precompilando bytecode ({cache_tag}) en {len(targets)} directorios...")
+    started = time.time()
+    result = subprocess.run(
+        [
+            python_exec,
+            "-m",
+            "compileall",
+            "-q",
+            "-j",
+            "0",
+            "--invalidation-mode",
+            "checked-hash",
+            "-x",
+            r"[\\/]\.git[\\/]",
+            *targets,
+        ]
+    )
+    # compileall devuelve 1 si algún fichero no compila (p. ej. scripts de
+    # ejemplo con sintaxis antigua); no impide usar la versión, pero sin sello
+    # se reintenta la próxima vez (los pycs ya válidos solo se comprueban).
+    if result.returncode != 0:
+        print("⚠️ Algunos ficheros no se pudieron precompilar.")
+        return
+
+    with open(stamp_path, "w") as f:
+        f.write(stamp)
+    print(f"Precompilación completada en {time.time() - started:.1f}s.")
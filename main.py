@@ -16,10 +16,30 @@ from PyQt6.QtWidgets import (
     QMessageBox,
     QInputDialog,
     QLabel,
+    QAbstractItemView,
 )
-from core.utils import ensure_dirs, load_config, save_config, get_free_port
+from core.utils import config_lock, ensure_dirs, load_config, save_config, get_free_port
 from core.odoo_manager import create_instance, run_instance, full_odoo_setup
 from core.postgres_manager import ensure_postgres, stop_postgres
+from core.pg_pooler import get_pooler_stats, stop_pooler
+from core.reverse_proxy import (
+    ensure_reverse_proxy,
+    instance_url,
+    is_reverse_proxy_running,
+    stop_reverse_proxy,
+)
+from core.scheduler import get_scheduler
+from core.reaper import schedule_reap
+from core.telemetry import start_metrics_server, stop_metrics_server
+from core.activator import (
+    activate_now,
+    disable_activation,
+    enable_activation,
+    hibernate_now,
+    is_activation_enabled,
+    release_activation,
+    stop_all_activations,
+)
 from core.installer_dialog import InstallerDialog, InstallerThread
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -102,6 +122,7 @@ class OdooManagerApp(QWidget):
 
         # Lista de instancias
         self.instance_list = QListWidget()
+        self.instance_list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         self.layout.addWidget(self.instance_list)
 
         # Botones
@@ -109,14 +130,24 @@ class OdooManagerApp(QWidget):
         self.btn_create = QPushButton("Crear instancia")
         self.btn_start = QPushButton("Iniciar")
         self.btn_stop = QPushButton("Detener")
+        self.btn_on_demand = QPushButton("Bajo demanda")
+        self.btn_bulk = QPushButton("Actualizar módulos")
+        self.btn_profile = QPushButton("Perfilar")
         self.btn_logs = QPushButton("Ver log")
+        self.btn_search_logs = QPushButton("Buscar en logs")
         self.btn_delete = QPushButton("Eliminar instancia")
+        self.btn_trash = QPushButton("Papelera")
 
         btn_layout.addWidget(self.btn_create)
         btn_layout.addWidget(self.btn_start)
         btn_layout.addWidget(self.btn_stop)
+        btn_layout.addWidget(self.btn_on_demand)
+        btn_layout.addWidget(self.btn_bulk)
+        btn_layout.addWidget(self.btn_profile)
         btn_layout.addWidget(self.btn_delete)
+        btn_layout.addWidget(self.btn_trash)
         btn_layout.addWidget(self.btn_logs)
+        btn_layout.addWidget(self.btn_search_logs)
         self.layout.addLayout(btn_layout)
 
         self.setLayout(self.layout)
@@ -124,7 +155,13 @@ class OdooManagerApp(QWidget):
         # Eventos
         self.btn_create.clicked.connect(self.create_instance)
         self.btn_start.clicked.connect(self.start_instance)
+        self.btn_stop.clicked.connect(self.stop_instance)
+        self.btn_on_demand.clicked.connect(self.toggle_on_demand)
+        self.btn_bulk.clicked.connect(self.bulk_update)
+        self.btn_profile.clicked.connect(self.toggle_profile)
         self.btn_logs.clicked.connect(self.show_log)
+        self.btn_search_logs.clicked.connect(self.search_logs)
+        self.btn_trash.clicked.connect(self.show_trash)
         self.btn_delete.clicked.connect(self.delete_instance)
 
         # PostgreSQL
@@ -136,19 +173,46 @@ class OdooManagerApp(QWidget):
         else:
             self.pg_label.setText("Usando PostgreSQL del sistema")
 
+        # Endpoint de métricas (tiempos de aprovisionamiento y ciclo de vida)
+        try:
+            start_metrics_server()
+        except OSError as e:
+            print(f"⚠️ No se pudo iniciar el endpoint de métricas: {e}")
+
+        # Retomar borrados de instancias que quedaron a medias
+        schedule_reap()
+
+        # Proxy inverso: <nombre>.localhost → puerto de la instancia
+        try:
+            ensure_reverse_proxy()
+        except OSError as e:
+            print(f"⚠️ No se pudo iniciar el proxy inverso: {e}")
+
+        # Instancias con activación bajo demanda: escuchar en su puerto
+        for inst in load_config().get("instances", []):
+            if inst.get("on_demand"):
+                try:
+                    enable_activation(inst, inst["on_demand"].get("idle_timeout", 600))
+                except OSError as e:
+                    print(f"⚠️ No se pudo activar bajo demanda '{inst['name']}': {e}")
 
         self.refresh_list()
 
     def refresh_list(self):
         self.instance_list.clear()
         config = load_config()
+        pool_stats = get_pooler_stats()
         for inst in config.get("instances", []):
             odoo_port = inst.get("odoo_port", "?")
             db_port = inst.get("db_port", "?")
             status = inst.get("status", "desconocido")
-            self.instance_list.addItem(
-                f"{inst['name']} - v{inst['version']} - Odoo:{odoo_port} / DB:{db_port} ({status})"
-            )
+            if is_activation_enabled(inst["name"]):
+                status += ", bajo demanda"
+            line = f"{inst['name']} - v{inst['version']} - Odoo:{odoo_port} / DB:{db_port} ({status})"
+            stats = pool_stats.get(inst["name"])
+            if stats:
+                line += f" [pool {stats['servers_active']}/{stats['servers_total']}, {stats['clients']} clientes]"
+            self.instance_list.addItem(line)
 
 
     def create_instance(self):
@@ -178,10 +242,22 @@ class OdooManagerApp(QWidget):
         if not ok:
             return
 
+        # Pooler de conexiones embebido (opcional)
+        use_pooler = (
+            QMessageBox.question(
+                self,
+                "Pooler de conexiones",
+                "¿Conectar la instancia a través del pooler embebido?\n"
+                "Reduce el número de conexiones abiertas en PostgreSQL.",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            )
+            == QMessageBox.StandardButton.Yes
+        )
+
         # Crear diálogo de instalación (ventana con barra de progreso)
         dlg = InstallerDialog(f"Instalando Odoo {version}")
         thread = InstallerThread(
-            full_odoo_setup, version, name, versions_dir, instances_dir, db_port
+            full_odoo_setup, version, name, versions_dir, instances_dir, db_port, use_pooler
         )
         thread.progress.connect(dlg.set_progress)
         thread.log.connect(dlg.append_log)
@@ -214,18 +290,172 @@ class OdooManagerApp(QWidget):
         config = load_config()
         instance = config["instances"][selected]
 
-        from core.odoo_manager import run_instance
-        run_instance(instance)
+        if is_activation_enabled(instance["name"]):
+            activate_now(instance["name"])
+        elif not get_scheduler().request_start(instance):
+            QMessageBox.information(
+                self,
+                "Instancia en cola",
+                f"No hay memoria o CPU suficientes para iniciar {instance['name']} ahora.\n"
+                "Se iniciará automáticamente cuando haya recursos libres.",
+            )
+            return
 
         odoo_port = instance.get("odoo_port", 8069)
         db_port = instance.get("db_port", 5433)
 
+        if is_reverse_proxy_running() and not is_activation_enabled(instance["name"]):
+            # Puede arrancar en modo prefork: el bus solo llega por el proxy.
+            message = (
+                f"{instance['name']} está corriendo en {instance_url(instance['name'])} "
+                f"(DB {db_port})\nPuerto directo {odoo_port}, sin chat ni notificaciones "
+                "si arranca con workers."
+            )
+        else:
+            message = f"{instance['name']} está corriendo en puerto {odoo_port} (DB {db_port})"
+        QMessageBox.information(self, "Instancia iniciada", message)
+
+
+    def stop_instance(self):
+        selected = self.instance_list.currentRow()
+        if selected < 0:
+            QMessageBox.warning(self, "Atención", "Selecciona una instancia para detener.")
+            return
+
+        config = load_config()
+        instance = config["instances"][selected]
+
+        get_scheduler().cancel(instance["name"])
+        if is_activation_enabled(instance["name"]):
+            hibernate_now(instance["name"])
+        else:
+            from core.odoo_manager import stop_instance
+            stop_instance(instance)
+
         QMessageBox.information(
-            self,
-            "Instancia iniciada",
-            f"{instance['name']} está corriendo en puerto {odoo_port} (DB {db_port})"
+            self, "Instancia detenida", f"{instance['name']} se ha detenido."
         )
 
+    def toggle_on_demand(self):
+        selected = self.instance_list.currentRow()
+        if selected < 0:
+            QMessageBox.warning(self, "Atención", "Selecciona una instancia.")
+            return
+
+        config = load_config()
+        instance = config["instances"][selected]
+        name = instance["name"]
+
+        if instance.get("on_demand"):
+            disable_activation(name)
+            on_demand = None
+        else:
+            idle_minutes, ok = QInputDialog.getInt(
+                self,
+                "Activación bajo demanda",
+                "Minutos de inactividad antes de detener la instancia:",
+                10, 1, 1440, 1,
+            )
+            if not ok:
+                return
+            from core.odoo_manager import stop_instance
+            stop_instance(instance)
+            try:
+                enable_activation(instance, idle_minutes * 60)
+            except OSError as e:
+                QMessageBox.critical(self, "Error", f"No se pudo escuchar en el puerto: {e}")
+                return
+            on_demand = {"idle_timeout": idle_minutes * 60}
+
+        # El diálogo puede haber estado abierto un rato: se relee la
+        # configuración para no pisar lo que hayan guardado otros hilos.
+        with config_lock:
+            config = load_config()
+            for inst in config["instances"]:
+                if inst["name"] == name:
+                    if on_demand:
+                        inst["on_demand"] = on_demand
+                    else:
+                        inst.pop("on_demand", None)
+            save_config(config)
+        self.refresh_list()
+
+    def bulk_update(self):
+        rows = sorted(self.instance_list.row(item) for item in self.instance_list.selectedItems())
+        if not rows:
+            QMessageBox.warning(self, "Atención", "Selecciona una o varias instancias.")
+            return
+
+        modules, ok = QInputDialog.getText(
+            self, "Actualizar módulos", "Módulos (separados por comas):"
+        )
+        if not ok or not modules.strip():
+            return
+
+        modes = ["Actualizar", "Actualizar y ejecutar tests"]
+        mode, ok = QInputDialog.getItem(self, "Modo", "Acción:", modes, 0, False)
+        if not ok:
+            return
+
+        config = load_config()
+        instances = [config["instances"][row] for row in rows]
+
+        from core.bulk_runner import bulk_job_setup
+        dlg = InstallerDialog(f"Actualizando {len(instances)} instancias")
+        thread = InstallerThread(
+            bulk_job_setup,
+            modules.split(","),
+            instances,
+            "test" if mode == modes[1] else "upgrade",
+        )
+        thread.progress.connect(dlg.set_progress)
+        thread.log.connect(dlg.append_log)
+        thread.finished_ok.connect(lambda: dlg.set_progress(100, "Completado."))
+        thread.finished_error.connect(lambda err: dlg.set_progress(100, f"❌ {err}"))
+        thread.start()
+        dlg.exec()
+
+    def toggle_profile(self):
+        selected = self.instance_list.currentRow()
+        if selected < 0:
+            QMessageBox.warning(self, "Atención", "Selecciona una instancia.")
+            return
+
+        config = load_config()
+        instance = config["instances"][selected]
+
+        from core.odoo_manager import find_instance_processes
+        from core.profiler import profile_dir, profiled_processes, toggle_profiling
+
+        if not find_instance_processes(instance):
+            if is_activation_enabled(instance["name"]):
+                QMessageBox.warning(
+                    self, "Atención", "Desactiva el modo bajo demanda para perfilar la instancia."
+                )
+                return
+            started = get_scheduler().request_start(instance, mode="profile")
+            QMessageBox.information(
+                self,
+                "Modo profile",
+                f"{instance['name']} se {'ha iniciado' if started else 'iniciará'} con el muestreo activo.\n"
+                f"Pilas en {profile_dir(instance)}",
+            )
+            return
+
+        if not profiled_processes(instance):
+            QMessageBox.warning(
+                self,
+                "Atención",
+                "La instancia no se lanzó en modo profile. Detenla y vuelve a pulsar Perfilar.",
+            )
+            return
+
+        enabled = toggle_profiling(instance)
+        QMessageBox.information(
+            self,
+            "Modo profile",
+            f"Muestreo {'activado' if enabled else 'en pausa'}.\nPilas en {profile_dir(instance)}",
+        )
 
     def show_log(self):
         selected = self.instance_list.currentRow()
@@ -240,7 +470,72 @@ class OdooManagerApp(QWidget):
             return
         os.system(f"notepad {log_path}" if os.name == "nt" else f"xdg-open {log_path}")
 
+    def search_logs(self):
+        config = load_config()
+        rows = sorted(self.instance_list.row(item) for item in self.instance_list.selectedItems())
+        # Sin selección se busca en todas las instancias.
+        instances = [config["instances"][row] for row in rows] or config.get("instances", [])
+        if not instances:
+            QMessageBox.warning(self, "Atención", "No hay instancias.")
+            return
+
+        levels = ["ERROR", "WARNING", "INFO", "DEBUG"]
+        level, ok = QInputDialog.getItem(self, "Buscar en logs", "Nivel mínimo:", levels, 0, False)
+        if not ok:
+            return
+        windows = {"Última hora": 3600, "Últimas 24 h": 86400, "Últimos 7 días": 7 * 86400, "Todo": None}
+        window, ok = QInputDialog.getItem(self, "Buscar en logs", "Periodo:", list(windows), 0, False)
+        if not ok:
+            return
+        since = time.time() - windows[window] if windows[window] else None
+
+        from core.log_index import log_search_setup
+        dlg = InstallerDialog(f"Logs {level} · {window.lower()}")
+        thread = InstallerThread(log_search_setup, instances, level, since)
+        thread.progress.connect(dlg.set_progress)
+        thread.log.connect(dlg.append_log)
+        thread.finished_error.connect(lambda err: dlg.set_progress(100, f"❌ {err}"))
+        thread.start()
+        dlg.exec()
+
+    def show_trash(self):
+        from core.reaper import discard_database, format_trash
+
+        # Reintenta en segundo plano lo pendiente cada vez que se consulta.
+        schedule_reap()
+        trash = load_config().get("trash", [])
+        pending_db = sorted({e["name"] for e in trash if not e.get("db_dropped")})
+        if not pending_db:
+            QMessageBox.information(self, "Papelera", format_trash(trash))
+            return
+
+        reply = QMessageBox.question(
+            self,
+            "Papelera",
+            f"{format_trash(trash)}\n\n¿Descartar la base de datos pendiente de alguna "
+            "instancia? Quedará en el servidor y el nombre se podrá reutilizar.",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        name, ok = QInputDialog.getItem(self, "Papelera", "Instancia:", pending_db, 0, False)
+        if not ok:
+            return
+        abandoned = discard_database(name)
+        schedule_reap()
+        QMessageBox.information(
+            self,
+            "Papelera",
+            f"Se deja de intentar eliminar {', '.join(abandoned)}; "
+            "la base de datos sigue en el servidor.",
+        )
+
     def closeEvent(self, event):
+        get_scheduler().stop()
+        stop_all_activations()
+        stop_reverse_proxy()
+        stop_pooler()
+        stop_metrics_server()
         stop_postgres()
         event.accept()
     
@@ -256,12 +551,15 @@ class OdooManagerApp(QWidget):
 
         reply = QMessageBox.question(
             self, "Confirmar eliminación",
-            f"¿Seguro que deseas eliminar la instancia '{name}'?\nEsta acción borrará todos los archivos.",
+            f"¿Seguro que deseas eliminar la instancia '{name}'?\nEsta acción borrará todos los archivos y su base de datos.",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
 
         if reply == QMessageBox.StandardButton.Yes:
             from core.odoo_manager import delete_instance
+            get_scheduler().cancel(name)
+            # Sin esperar a que Odoo se detenga: de eso se encarga el reaper.
+            release_activation(name)
             deleted = delete_instance(name, instances_dir)
             if deleted:
                 QMessageBox.information(self, "Instancia eliminada", f"'{name}' fue eliminada.")